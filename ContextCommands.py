@@ -6,10 +6,8 @@ import threading
 import re
 
 
-to_snake_case_pattern = re.compile(r'(?!^)(?<!_)([A-Z])')
-
 def to_snake_case(txt):
-	return to_snake_case_pattern.sub(r'_\1', txt).lower()
+	return re.sub(r'(?!^)(?<!_)([A-Z])', r'_\1', txt).lower()
 
 # todo: double check this and convert AdaCaseSelectionCommand to use it like SnakeCaseSelectionCommand uses to_snake_case
 def to_ada_case(txt):
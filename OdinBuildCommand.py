@@ -1,17 +1,20 @@
 import sublime
 import sublime_plugin
 import os
+import time
 import shutil
 import subprocess as subp
 
 from Odin import odin_set_vc_vars
+from Odin import native_index
+from Odin import build_cache
 
 SENTINEL="SUBL_VC_VARS"
 
 class OdinBuildCommand(sublime_plugin.WindowCommand):
-	def run(self, metal=False, d3d11=False, opt_level=0, print_args=False, apitrace=False):
+	def run(self, metal=False, d3d11=False, opt_level=0, print_args=False, apitrace=False, force=False):
 		if sublime.platform() == 'windows':
-			self.build_win(d3d11, opt_level)
+			self.build_win(d3d11, opt_level, force)
 			return
 
 		vars = self.window.extract_variables()
@@ -20,19 +23,29 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 			args.append('-define:METAL=1')
 
 		# we use the native_dirs to make a DYLD_LIBRARY_PATH
-		native_dirs = self.get_all_native_paths()
+		libraries = self.get_native_index()
+		native_dirs = self.get_all_native_paths(libraries)
 
 		# build up a run command to happen after the build command
 		lib_path = '.:' + ':'.join(native_dirs)
 		os.environ['DYLD_LIBRARY_PATH'] = lib_path
 
-		exe_exists = '[ -f ' + os.path.join(vars['file_path'], vars['file_base_name']) + ' ]'
-		args.extend(['&&', 'export', 'DYLD_LIBRARY_PATH=' + lib_path + ';', exe_exists, '&&', './' + vars['file_base_name']])
+		exe_path = os.path.join(vars['file_path'], vars['file_base_name'])
+		exe_exists = '[ -f ' + exe_path + ' ]'
+		run_args = ['export', 'DYLD_LIBRARY_PATH=' + lib_path + ';', exe_exists, '&&', './' + vars['file_base_name']]
+
+		# nothing changed since the last build so the executable is just run again
+		up_to_date = not apitrace and self.is_build_up_to_date(vars, ' '.join(args), libraries, exe_path, force)
+		if up_to_date:
+			args = run_args
+		else:
+			args.extend(['&&'] + run_args)
 
 		if print_args:
 			print(args)
 
 		if apitrace:
+			build_cache.build_cache.forget(exe_path)
 			args.pop()
 			args.append('apitrace trace --api gl ./' + vars['file_base_name'])
 			self.window.active_view().window().run_command('exec', {
@@ -46,8 +59,8 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 			return
 
 		# kill the old exe so that we fail to run anything if we dont build
-		if os.path.exists(vars['file_base_name']):
-			os.remove(vars['file_base_name'])
+		if not up_to_date and os.path.exists(exe_path):
+			os.remove(exe_path)
 
 		self.window.active_view().window().run_command('exec', {
 			'shell': True,
@@ -58,7 +71,7 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 			'syntax': 'BuildOutput.sublime-syntax'
 		})
 	
-	def build_win(self, d3d11=False, opt_level=0):
+	def build_win(self, d3d11=False, opt_level=0, force=False):
 		odin_set_vc_vars.set()
 		vars = self.window.extract_variables()
 		dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -72,7 +85,8 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 		args.append(build_opt)
 
 		# get all our dll paths
-		native_libs = self.get_all_native_paths('.lib', True)
+		libraries = self.get_native_index()
+		native_libs = self.get_all_native_paths(libraries, '.lib', True)
 		native_libs = map(lambda path: path.replace('/', '\\'), native_libs)
 
 		filter_lib = 'sokol_gl' if d3d11 else 'sokol_d3d11'
@@ -84,7 +98,7 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 		args.append('"' + ' '.join(native_libs) + '"')
 
 		# shove all our dll paths in the PATH environment var, being careful not to dupe them
-		native_dlls = list(map(lambda path: path.replace('/', '\\'), self.get_all_native_paths('.dll', False)))
+		native_dlls = list(map(lambda path: path.replace('/', '\\'), self.get_all_native_paths(libraries, '.dll', False)))
 		env_path = os.environ['PATH']
 		native_dlls = [path for path in native_dlls if path not in env_path]
 
@@ -94,6 +108,18 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 		if len(native_dlls) > 0:
 			os.environ['PATH'] = os.environ['PATH'] + ';' + ';'.join(native_dlls)
 
+		# nothing changed since the last build so the executable is just run again. Otherwise the old build is removed so that
+		# a failed build has nothing to link or run.
+		exe_path = os.path.join(vars['file_path'], vars['file_base_name'] + '.exe')
+		if self.is_build_up_to_date(vars, ' '.join(args[1:]), libraries, exe_path, force):
+			args = [vars['file_base_name'] + '.exe']
+		else:
+			for ext in ['.exe', '.obj']:
+				try:
+					os.remove(os.path.join(vars['file_path'], vars['file_base_name'] + ext))
+				except OSError:
+					pass
+
 		self.window.active_view().window().run_command('exec', {
 			'shell': True,
 			'shell_cmd': ' '.join(args),
@@ -103,19 +129,36 @@ class OdinBuildCommand(sublime_plugin.WindowCommand):
 			'syntax': 'BuildOutput.sublime-syntax'
 		})
 
+	def get_odin_path(self):
+		return os.path.expanduser(self.window.active_view().settings().get('odin_install_path', '~/odin'))
+
+	# the index of the native libraries in the 'odin/shared' folder, refreshed once per build and saved between sessions
+	def get_native_index(self):
+		return native_index.get_index(os.path.join(self.get_odin_path(), 'shared'), os.path.join(sublime.cache_path(), 'Odin', 'native_index.pickle'))
+
+	# whether exe_path was built from the same sources, flags, compiler and native libraries. If not (or with force) the
+	# hash of the inputs is remembered for the build that is about to run.
+	def is_build_up_to_date(self, vars, flags, libraries, exe_path, force=False):
+		cache = build_cache.build_cache
+		if not self.window.active_view().settings().get('odin_build_cache', True):
+			cache.forget(exe_path)
+			return False
+
+		cache_path = os.path.join(sublime.cache_path(), 'Odin', 'build_cache.pickle')
+		cache.load(cache_path)
+		inputs_hash = cache.hash_inputs(vars['file'], self.get_odin_path(), flags, libraries)
+		if not force and cache.is_up_to_date(exe_path, inputs_hash):
+			print('Odin: {} is up to date, skipping the build'.format(exe_path))
+			return True
+
+		cache.record(exe_path, inputs_hash, time.time())
+		try:
+			cache.save(cache_path)
+		except OSError as e:
+			print('Odin: could not save the build cache: {}'.format(e))
+		return False
+
 	# fetches all the paths that have dylibs/dlls in them in folders named 'native' in the 'odin/shared' folder
-	def get_all_native_paths(self, lib_ext='.dylib', append_lib_name=False):
-		native_dirs = []
-		odin_path = os.path.expanduser(self.window.active_view().settings().get('odin_install_path', '~/odin'))
-		odin_shared_path = os.path.join(odin_path, 'shared')
-		for root, dirs, files in os.walk(odin_shared_path):
-			dirs[:] = list(filter(lambda x: not x == '.git', dirs))
-			if root.endswith('native'):
-				for f in files:
-					if f.endswith(lib_ext):
-						if append_lib_name:
-							native_dirs.append(os.path.join(root, f))
-						else:
-							native_dirs.append(root)
-		return native_dirs
+	def get_all_native_paths(self, libraries, lib_ext='.dylib', append_lib_name=False):
+		return [os.path.join(root, f) if append_lib_name else root for root, f in libraries.find(lib_ext)]
 
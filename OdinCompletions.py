@@ -1,32 +1,220 @@
+import time
+# when the plugin host started importing the plugin, the import time is kept in the completion stats
+plugin_import_start_secs = time.perf_counter()
+
 import sublime
 import sublime_plugin
-import re
 import os
-import platform
-import glob
-import fnmatch
-import time
+import html
+import threading
 from Odin import parser
+from Odin import indexer
+from Odin import package_index
+from Odin import odin_completer
+from Odin import index_pool
+from Odin import stats
+
+
+# nothing is parsed, indexed or compiled (the regexes are parser.LazyPattern) until an Odin view is activated. Sublime
+# does not send on_activated for the view that is already active when the plugin loads so that one is picked up here.
+def plugin_loaded():
+  timer = stats.RequestTimer()
+  view = sublime.active_window().active_view()
+  if view != None and is_odin_view(view):
+    sublime.set_timeout_async(lambda: OdinCompletions().on_activated_async(view))
+  timer.mark('plugin_loaded')
+  stats.completion_stats.add(*timer.phases[0])
+
+
+def plugin_unloaded():
+  indexer.stop()
+  odin_completer.completer.stop()
+  index_pool.pool.stop()
+  if parser.file_symbols_cache.dirty:
+    parser.file_symbols_cache.save(symbol_index_path())
+
+
+def symbol_index_path():
+  return os.path.join(sublime.cache_path(), 'Odin', 'symbol_index.pickle')
+
+
+def is_odin_view(view):
+  return view.file_name() != None and view.file_name().endswith('.odin')
+
+
+# opens the file of symbol at its declaration
+def open_symbol(window, symbol, flags=0):
+  window.open_file('{}:{}:{}'.format(symbol.file, symbol.line + 1, symbol.column + 1), sublime.ENCODED_POSITION | flags)
+
+
+# incrementally updated declarations of the open Odin buffers by buffer id. Only touched on the indexer thread.
+buffer_models = dict()
+# edits not yet applied to the models: buffer id -> [(change_count after the edits, [(begin, end, text)])]
+pending_buffer_edits = dict()
+pending_buffer_edits_lock = threading.Lock()
+
+
+# runs on the indexer. Applies the pending edits of the buffer of view to its model and publishes the declarations to the
+# symbol cache once the model caught up with the buffer. The model is (re)built from the full text when there is none or
+# it got out of sync, ie edits made before the listener was attached.
+def update_buffer_model(view):
+  buffer_id = view.buffer_id()
+  with pending_buffer_edits_lock:
+    batches = pending_buffer_edits.pop(buffer_id, [])
+
+  if not view.is_valid():
+    buffer_models.pop(buffer_id, None)
+    return
+
+  model = buffer_models.get(buffer_id)
+  if model != None:
+    for change_count, edits in batches:
+      if change_count > model.change_count:
+        for begin, end, text in edits:
+          model.apply_edit(begin, end, text)
+        model.change_count = change_count
+
+  with pending_buffer_edits_lock:
+    more_edits = buffer_id in pending_buffer_edits
+  if model == None:
+    out_of_sync = True
+  elif model.change_count == view.change_count():
+    out_of_sync = len(model.text) != view.size()
+  else:
+    out_of_sync = not more_edits
+
+  if out_of_sync:
+    model = read_buffer_model(view)
+    if model == None:
+      return
+    buffer_models[buffer_id] = model
+
+  key = ('view', buffer_id, model.change_count)
+  path = view.file_name()
+  if path != None and model.change_count == view.change_count() and parser.file_symbols_cache.get_symbols(path, key) == None:
+    parser.file_symbols_cache.set_symbols(path, key, model.declarations)
+
+
+# scans the whole text of view, retrying if it was edited while being read
+def read_buffer_model(view):
+  for _ in range(3):
+    change_count = view.change_count()
+    text = view.substr(sublime.Region(0, view.size()))
+    if view.change_count() == change_count:
+      return parser.BufferModel(text, change_count, view.file_name() or '')
+  return None
+
+
+# the imports of a file. alias_to_package maps the name a package is used by in the file to the package name.
+class FileImports(object):
+  def __init__(self, package, alias_to_package, core_packages, shared_packages, local_packages):
+    self.package = package
+    self.alias_to_package = alias_to_package
+    self.core_packages = core_packages
+    self.shared_packages = shared_packages
+    self.local_packages = local_packages
+
+  # the imported package that name (an alias or package name) refers to, or None
+  def resolve_package(self, name):
+    package = self.alias_to_package.get(name, name)
+    if package in self.core_packages or package in self.shared_packages or package in self.local_packages:
+      return package
+    return None
+
+  def alias_for_package(self, package):
+    for k, v in self.alias_to_package.items():
+      if v == package:
+        return k
+    return package
+
+  # packages from the odin core and shared folders are cached by the parser as 'core:name' and 'shared:name'
+  def get_package_cache_key(self, package):
+    if package in self.core_packages:
+      return 'core:' + package
+    if package in self.shared_packages:
+      return 'shared:' + package
+    return None
+
+
+# imports of the open views by view id: (change_count, header text, FileImports)
+imports_by_view = dict()
+imports_by_view_lock = threading.Lock()
+# the change_count each open view last had its completion popup refresh queued at, by view id. Only touched on the main
+# thread.
+refreshed_change_counts = dict()
+
+
+# the text of view up to its first declaration, which is where the package and imports are. Read in growing chunks so
+# that a large file is never copied whole.
+def read_import_header(view):
+  size = view.size()
+  length = 4096
+  while True:
+    text = view.substr(sublime.Region(0, min(length, size)))
+    end = parser.find_header_end(text)
+    # a declaration on the last line of a chunk may be a cut off string
+    if length >= size or (end != None and end < text.rfind('\n')):
+      return text[:end] if end != None else text
+    length *= 4
+
+
+# the line around a location, fetched with a single substr so that the context of a completion is worked out locally
+# instead of with an API call per character
+class LineSnapshot(object):
+  def __init__(self, view, location):
+    region = view.line(location)
+    self.begin = region.begin()
+    self.text = view.substr(region)
+    self.column = location - self.begin
+
+  def is_word_char(self, char):
+    return char.isalnum() or char == '_'
+
+  # the word before the '.' that the location is typing after (ie 'fmt' for 'fmt.pri|'), '' for a '.' after anything but
+  # a word, None when there is no '.' and False when the location is in the middle of a word
+  def get_prefix_before_dot(self):
+    # next char should be some type of space, paren or non-word
+    if self.text[self.column:self.column + 1].isalnum():
+      return False
+
+    # walk backwards until we find a '.'. If we hit a non-char (a-zA-Z0-9_) bail out since this isnt a completion
+    loc = self.column
+    while loc > 0 and self.is_word_char(self.text[loc - 1]):
+      loc -= 1
+    if loc == 0 or self.text[loc - 1] != '.':
+      return None
+
+    dot_loc = loc - 1
+    loc = dot_loc
+    while loc > 0 and self.is_word_char(self.text[loc - 1]):
+      loc -= 1
+    return self.text[loc:dot_loc]
+
+
+# records the edits of open Odin buffers so that the indexer only re-scans the declarations they touched
+class OdinBufferListener(sublime_plugin.TextChangeListener):
+  @classmethod
+  def is_applicable(cls, buffer):
+    view = buffer.primary_view()
+    return view != None and is_odin_view(view)
+
+  def on_text_changed(self, changes):
+    view = self.buffer.primary_view()
+    buffer_id = self.buffer.id()
+    with pending_buffer_edits_lock:
+      pending_buffer_edits.setdefault(buffer_id, []).append((view.change_count(), [(c.a.pt, c.b.pt, c.str) for c in changes]))
+    indexer.submit(('buffer', buffer_id), lambda: update_buffer_model(view))
 
 
 class OdinCompletions(sublime_plugin.EventListener):
-  full_reindex_interval_secs = 60 * 10 # Ten minutes
-  last_full_reindex_secs = -full_reindex_interval_secs
-  alias_to_package = dict()
-
-  package_pattern = re.compile(r'package\s+(.*)')
-  core_package_pattern = re.compile(r'import\s(\w+|)\s*\"(?:core:)+(.*?)\"')
-  shared_package_pattern = re.compile(r'import\s(\w+|)\s*\"(?:shared:)+(.*?)\"')
-  local_package_pattern = re.compile(r'import\s(\w+|)\s*\"(?!.*?:)(\w+)+(.*?)\"')
-
-  # the package of the current file
-  current_package = ''
-  # the package we are completing (ie fmt.nnn would be 'fmt')
-  search_package = None
-  included_core_packages = []
-  included_local_packages = []
-  included_shared_packages = []
-  before_dot = None
+  symbol_index_save_interval_secs = 60
+  last_symbol_index_save_secs = 0
+  symbol_index_loaded = False
+
+  package_pattern = parser.LazyPattern(r'package\s+(.*)')
+  core_package_pattern = parser.LazyPattern(r'import\s(\w+|)\s*\"(?:core:)+(.*?)\"')
+  shared_package_pattern = parser.LazyPattern(r'import\s(\w+|)\s*\"(?:shared:)+(.*?)\"')
+  local_package_pattern = parser.LazyPattern(r'import\s(\w+|)\s*\"(?!.*?:)(\w+)+(.*?)\"')
 
   built_in_procs = [
     ['make(array_map: Array_Map_Type, size: int) \tBuilt-in', 'make(${1:array_map: Array_Map_Type}, ${2:size: int})'],
@@ -36,231 +224,643 @@ class OdinCompletions(sublime_plugin.EventListener):
     ['panic(message := "", loc := #caller_location) \tBuilt-in', 'panic(${1:message := "": string}, ${2:loc := #caller_location: $E})'],
     ['assert(condition: bool, message := "", loc := #caller_location) \tBuilt-in', 'assert(${1:condition: bool}, ${2:message := "": string}, ${3:loc := #caller_location: $E})']
   ]
+  built_in_index = None
 
-  def alias_for_package(self, package):
-    for k, v in self.alias_to_package.items():
-      if v == package:
-        return k
-    return package
+  def get_built_in_index(self):
+    if OdinCompletions.built_in_index == None:
+      OdinCompletions.built_in_index = parser.CompletionIndex(self.built_in_procs)
+    return OdinCompletions.built_in_index
 
   def add_import(self, view, package):
     view.hide_popup()
     sublime.active_window().run_command('insert_import', {'package': package})
 
-  def get_all_odin_file_paths(self, view):
+  # returns the files to pull completions from along with a flag that is False if some package folders are not indexed
+  # yet. Only already indexed folder data is used here, anything missing gets queued on the background indexer.
+  def get_all_odin_file_paths(self, view, imports, before_dot, prompt_import=True):
     odin_path = os.path.expanduser(view.settings().get('odin_install_path', '~/odin'))
     paths = set()
-    window = sublime.active_window()
+    complete = True
 
-    word_before_dot = self.alias_to_package[self.before_dot] if self.before_dot in self.alias_to_package else self.before_dot
+    word_before_dot = imports.alias_to_package.get(before_dot, before_dot)
 
     # use this data to filter so we dont pile on unecessary files to parse
-    is_core_package_completion = word_before_dot in self.included_core_packages
-    is_shared_package_completion = word_before_dot in self.included_shared_packages
-    is_local_package_completion = word_before_dot in self.included_local_packages
+    is_core_package_completion = word_before_dot in imports.core_packages
+    is_shared_package_completion = word_before_dot in imports.shared_packages
+    is_local_package_completion = word_before_dot in imports.local_packages
     is_var_field_access = word_before_dot != None and not is_core_package_completion and not is_local_package_completion and not is_shared_package_completion
 
     # if we have a word before the dot and is_var_field_access = True this could potentially be a package
-    # name that we can add an auto-import for
-    if word_before_dot != None and is_var_field_access and word_before_dot in parser.package_to_path:
+    # name that we can add an auto-import for. The package map is updated in the background so it is read once.
+    package_to_import = package_index.package_to_path.get(word_before_dot) if is_var_field_access else None
+    if prompt_import and package_to_import != None:
       if view.settings().get('odin_prompt_for_package_import', True):
-        package_to_import = parser.package_to_path[word_before_dot]
         content = '<body style="border: 2px solid white; margin: 0px; padding: 4px;"><h4>Add Package Import</h4><a href="{}">{}</a>'.format(package_to_import, package_to_import)
         view.show_popup(content, sublime.HIDE_ON_MOUSE_MOVE_AWAY, -1, 500, 300, lambda package: self.add_import(view, package))
-        # view.show_popup_menu(['Add import   ' + parser.package_to_path[word_before_dot]], lambda index: self.add_import(view, parser.package_to_path[word_before_dot]) if index >= 0 else None)
+        # view.show_popup_menu(['Add import   ' + package_to_import], lambda index: self.add_import(view, package_to_import) if index >= 0 else None)
+
+    def files_for_package(root, package):
+      index = package_index.get_index(root)
+      if not index.is_ready():
+        return False
+      # only the files that build for the target platform are listed
+      for files in index.files_for_package(package, validate=False).values():
+        paths.update(files)
+      return True
 
     if word_before_dot == None and not is_var_field_access:
       paths.add(os.path.join(odin_path, 'core/builtin/builtin.odin'))
 
-      # self.current_package is where we will source our files from
-      current_folder = os.path.dirname(sublime.active_window().active_view().file_name())
-      for file in glob.glob(current_folder + '/*.odin'):
-        paths.add(file)
-
+      # the current package is where we will source our files from
+      current_folder = os.path.dirname(view.file_name())
+      index = package_index.get_index(current_folder)
+      paths.update(index.files_in(current_folder, validate=False))
+      complete = index.is_ready()
+      # the current file is always a candidate, even before its folder is indexed
+      paths.add(view.file_name())
 
     if is_local_package_completion and not is_var_field_access:
-      self.search_package = word_before_dot
-      if len(self.included_local_packages) > 0:
-        curr_path = os.path.dirname(sublime.active_window().active_view().file_name())
-        for root, dirs, files in os.walk(curr_path):
-          dirs[:] = list(filter(lambda x: not x == '.git', dirs))
-          root_dir = os.path.basename(root)
-          if root_dir == word_before_dot and root_dir in self.included_local_packages:
-            for file in fnmatch.filter(files, '*.odin'):
-              paths.add(os.path.join(root, file))
+      complete = files_for_package(os.path.dirname(view.file_name()), word_before_dot) and complete
 
     if is_shared_package_completion and not is_var_field_access:
-      self.search_package = word_before_dot
       # include any imported shared packages
-      if len(self.included_shared_packages) > 0:
-        odin_shared_path = os.path.join(odin_path, 'shared')
-        for root, dirs, files in os.walk(odin_shared_path):
-          dirs[:] = list(filter(lambda x: not x == '.git', dirs))
-          root_dir = os.path.basename(root)
-          if root_dir == word_before_dot and root_dir in self.included_shared_packages:
-            for file in fnmatch.filter(files, '*.odin'):
-              paths.add(os.path.join(root, file))
+      complete = files_for_package(os.path.join(odin_path, 'shared'), word_before_dot) and complete
 
     if is_core_package_completion and not is_var_field_access:
-      self.search_package = word_before_dot
       # include any imported core packages
-      if len(self.included_core_packages) > 0:
-        odin_lib_path = os.path.join(odin_path, 'core')
-        for root, dirs, files in os.walk(odin_lib_path):
-          root_dir = os.path.basename(root)
-          if root_dir == word_before_dot and root_dir in self.included_core_packages:
-            # special care for os
-            if root_dir == 'os':
-              paths.add(os.path.join(root, 'os.odin'))
-              paths.add(os.path.join(root, 'os_' + platform.system().lower() + '.odin'))
-            else:
-              for file in fnmatch.filter(files, '*.odin'):
-                paths.add(os.path.join(root, file))
-
-    return paths
-
-  def get_file_contents(self, file_path):
-    file_view = sublime.active_window().find_open_file(file_path)
-    if file_view == None:
-      with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
+      complete = files_for_package(os.path.join(odin_path, 'core'), word_before_dot) and complete
+
+    return paths, complete
+
+  # loads the symbol index saved by the previous session the first time an Odin view shows up. Files that changed since
+  # then are re-parsed in the background.
+  def load_symbol_index(self, view):
+    if OdinCompletions.symbol_index_loaded or not is_odin_view(view):
+      return
+
+    OdinCompletions.symbol_index_loaded = True
+    OdinCompletions.last_symbol_index_save_secs = time.time()
+    timer = stats.RequestTimer()
+    loaded = parser.file_symbols_cache.load(symbol_index_path())
+    timer.mark('symbol_index_load')
+    stats.completion_stats.add(*timer.phases[0])
+    if len(loaded) > 0:
+      indexer.submit('revalidate', parser.revalidate_file_symbols)
     else:
-      return file_view.substr(sublime.Region(0, file_view.size()))
+      # nothing saved yet, the whole install is indexed in parallel in the background
+      window = view.window()
+      def indexed(count, secs):
+        sublime.set_timeout(lambda: window.status_message('Odin: indexed {} files in {:.1f}s'.format(count, secs)))
+      indexer.submit('cold_index', lambda: self.index_paths_in_parallel(view, 'cold_index', self.get_workspace_paths(view), indexed))
+
+  def save_symbol_index(self):
+    if parser.file_symbols_cache.dirty and time.time() - self.last_symbol_index_save_secs > self.symbol_index_save_interval_secs:
+      OdinCompletions.last_symbol_index_save_secs = time.time()
+      parser.file_symbols_cache.save(symbol_index_path())
+
+  # queues the package of view and all the packages it imports for (re)indexing in the background
+  def index_view_packages(self, view):
+    if is_odin_view(view):
+      indexer.submit(('view', view.id()), lambda: self.index_view_packages_job(view))
+
+  def index_view_packages_job(self, view):
+    if view.file_name() == None:
+      return
 
-  # return True if all the previous chars are valid (a-zA-Z0-9_) up to the '.'
-  def get_prefix_before_dot(self, file_view, loc):
-    # next char should be some type of space, paren or non-word
-    next_char = file_view.substr(sublime.Region(loc, loc + 1))
-    if next_char.isalnum():
-      return False
-
-    # walk backwards until we find a '.'. If we hit a non-char (a-zA-Z0-9_) bail out since this isnt a completion
-    curr_line_region = file_view.line(loc)
-
-    def get_before_dot(dot_loc):
-      region_end = dot_loc
-      while dot_loc > curr_line_region.begin():
-        prev_char = file_view.substr(sublime.Region(dot_loc - 1, dot_loc))
-        if prev_char.isalnum() or prev_char == '_':
-          dot_loc -= 1
-        else:
-          return file_view.substr(sublime.Region(dot_loc, region_end))
-      return None
-
-    while loc > curr_line_region.begin():
-      char = file_view.substr(sublime.Region(loc - 1, loc))
-      if char == '.':
-        return get_before_dot(loc - 1)
-
-      if char.isalnum() or char == '_':
-        loc -= 1
-      else:
-        return None
-    return None
-
-  def extract_includes(self):
-    contents = sublime.active_window().active_view().substr(sublime.Region(0, sublime.active_window().active_view().size()))
-    self.current_package = self.package_pattern.findall(contents)[0]
-    core_packages = self.core_package_pattern.findall(contents)
-    shared_packages = self.shared_package_pattern.findall(contents)
-    local_packages = self.local_package_pattern.findall(contents)
-
-    for mod in core_packages:
+    odin_path = os.path.expanduser(view.settings().get('odin_install_path', '~/odin'))
+    current_folder = os.path.dirname(view.file_name())
+    imports = self.get_view_imports(view)
+
+    package_index.set_target(view.settings().get('odin_target'))
+    parser.file_contents_cache.configure(view.settings().get('odin_file_cache_max_mb', 8) * 1024 * 1024)
+    package_index.update_package_paths(odin_path)
+    local_index = package_index.get_index(current_folder)
+    local_index.refresh()
+    paths = [os.path.join(odin_path, 'core/builtin/builtin.odin')] + local_index.files_in(current_folder)
+    package_paths = []
+    for index, packages in [(local_index, imports.local_packages), (package_index.get_index(os.path.join(odin_path, 'core')), imports.core_packages),
+      (package_index.get_index(os.path.join(odin_path, 'shared')), imports.shared_packages)]:
+      for package in packages:
+        files = [path for files in index.files_for_package(package).values() for path in files]
+        paths.extend(files)
+        package_paths.append((imports.get_package_cache_key(package), files))
+
+    for path in paths:
+      self.index_file_job(path)
+
+    for cache_key, files in package_paths:
+      if cache_key != None:
+        self.cache_package_completions(cache_key, files)
+
+  # merges the completion indexes of the files of a core/shared package and the overload variants that live in other
+  # files of it into the package cache, unless it is current. Runs on the indexer so that queries only look it up.
+  def cache_package_completions(self, cache_key, paths):
+    if parser.completions_cache.is_current(cache_key):
+      return
+
+    sources = []
+    for path in paths:
+      symbols = parser.file_symbols_cache.get_latest_symbols(path)
+      if symbols == None:
+        return
+      sources.append((path, symbols))
+
+    files = [symbols for _, symbols in sources]
+    completions = [c for symbols in files for c in symbols.get_completion_index().completions]
+    completions.extend(parser.make_package_overload_symbols(files))
+    parser.completions_cache.set_completions(cache_key, parser.CompletionIndex(completions), sources)
+
+  def index_file(self, path):
+    indexer.submit(('file', path), lambda: self.index_file_job(path))
+
+  # open buffers are indexed through their incrementally updated model, files on disk are parsed when they changed
+  def index_file_job(self, path):
+    timer = stats.RequestTimer()
+    file_view = sublime.active_window().find_open_file(path)
+    if file_view != None:
+      update_buffer_model(file_view)
+      timer.mark('buffer_update')
+      stats.completion_stats.add(*timer.phases[0])
+      return
+
+    # the read is timed on its own, the rest of index_file only counts as parsing when the file was actually read
+    read_ms = []
+    def read_file(path, key):
+      start = time.perf_counter()
+      text = parser.read_file_text(path, key)
+      read_ms.append((time.perf_counter() - start) * 1000)
+      return text
+
+    parser.index_file(path, parser.get_file_key, read_file)
+    timer.mark('index_file')
+    if len(read_ms) > 0:
+      stats.completion_stats.add('file_read', read_ms[0])
+      stats.completion_stats.add('file_parse', timer.total_ms() - read_ms[0])
+      stats.completion_stats.count('files_indexed')
+
+  # re-opens the completion popup once the indexer caught up, unless the user typed something in the meantime
+  def refresh_completions_when_indexed(self, view):
+    change_count = view.change_count()
+    if refreshed_change_counts.get(view.id()) == change_count:
+      return
+    refreshed_change_counts[view.id()] = change_count
+
+    indexer.when_idle(lambda: self.refresh_completions(view, change_count))
+
+  # re-opens the completion popup on the main thread, unless the user typed something since change_count
+  def refresh_completions(self, view, change_count):
+    def refresh():
+      if view.change_count() == change_count:
+        view.run_command('auto_complete', {'disable_auto_insert': True, 'next_completion_if_showing': False})
+    sublime.set_timeout(refresh)
+
+  # completions of package from the odin query backend, or None while there are none. The query for the folder of view
+  # runs in the background and the popup is refreshed once it is done.
+  def get_query_completions(self, view, package):
+    odin_completer.completer.timeout_secs = view.settings().get('odin_query_timeout_secs', 10)
+    change_count = view.change_count()
+    results = odin_completer.completer.get_completions(os.path.dirname(view.file_name()), lambda: self.refresh_completions(view, change_count))
+    return results.get(package) if results != None else None
+
+  def on_load_async(self, view):
+    self.load_symbol_index(view)
+    self.index_view_packages(view)
+
+  def on_activated_async(self, view):
+    self.load_symbol_index(view)
+    self.save_symbol_index()
+    self.index_view_packages(view)
+
+  # once the last view of a buffer is closed its model is dropped and the file is indexed from disk again
+  def on_close(self, view):
+    with imports_by_view_lock:
+      imports_by_view.pop(view.id(), None)
+    refreshed_change_counts.pop(view.id(), None)
+
+    if is_odin_view(view) and len(view.buffer().views()) <= 1:
+      buffer_id = view.buffer_id()
+      path = view.file_name()
+
+      def closed():
+        buffer_models.pop(buffer_id, None)
+        parser.index_file(path, parser.get_file_key, parser.read_file_text)
+      indexer.submit(('closed', buffer_id), closed)
+
+  # returns the FileImports of the package and import lines in contents
+  def parse_imports(self, contents):
+    packages = self.package_pattern.findall(contents)
+    alias_to_package = dict()
+    included_core_packages = []
+    included_shared_packages = []
+    included_local_packages = []
+
+    for mod in self.core_package_pattern.findall(contents):
       package = os.path.basename(os.path.normpath(mod[1]))
       alias = mod[0] or package
-      self.alias_to_package[alias] = package
-      self.included_core_packages.append(package)
+      alias_to_package[alias] = package
+      included_core_packages.append(package)
 
-    for mod in shared_packages:
+    for mod in self.shared_package_pattern.findall(contents):
       package = os.path.basename(os.path.normpath(mod[1]))
       alias = mod[0] or package
-      self.alias_to_package[alias] = package
-      self.included_shared_packages.append(package)
+      alias_to_package[alias] = package
+      included_shared_packages.append(package)
 
-    for mod in local_packages:
+    for mod in self.local_package_pattern.findall(contents):
       # we prefar the last match but if there is no '/' in the path match[1] will be our folder/package
       package = mod[2] or mod[1]
       package = os.path.basename(os.path.normpath(package))
       alias = mod[0] or package
-      self.alias_to_package[alias] = package
-      self.included_local_packages.append(package)
+      alias_to_package[alias] = package
+      included_local_packages.append(package)
+
+    return FileImports(packages[0] if len(packages) > 0 else '', alias_to_package, included_core_packages, included_shared_packages, included_local_packages)
+
+  # the imports of view, cached by its change_count. Only the header of the file is read and the imports are only parsed
+  # again when the header changed.
+  def get_view_imports(self, view):
+    change_count = view.change_count()
+    with imports_by_view_lock:
+      entry = imports_by_view.get(view.id())
+    if entry != None and entry[0] == change_count:
+      stats.completion_stats.count('imports_cache_hits')
+      return entry[2]
+
+    header = read_import_header(view)
+    if entry != None and entry[1] == header:
+      stats.completion_stats.count('imports_cache_hits')
+      imports = entry[2]
+    else:
+      stats.completion_stats.count('imports_cache_misses')
+      imports = self.parse_imports(header)
+    with imports_by_view_lock:
+      imports_by_view[view.id()] = (change_count, header, imports)
+    return imports
+
+  # the declaration of name in the package before_dot resolves to (the current package when None). Every file is looked
+  # up by name in its indexed symbols, only files that were never indexed are parsed. The current view is parsed as is
+  # when the indexer did not catch up with it yet so that the position is never stale.
+  def find_declaration(self, view, name, before_dot):
+    imports = self.get_view_imports(view)
+    paths, _ = self.get_all_odin_file_paths(view, imports, before_dot, prompt_import=False)
+    view_path = view.file_name()
+
+    for path in sorted(paths, key=lambda path: (path != view_path, path)):
+      symbols = parser.file_symbols_cache.get_latest_symbols(path)
+      if path == view_path and (symbols == None or symbols.key != ('view', view.buffer_id(), view.change_count())):
+        symbols = parser.FileSymbols(None, parser.scan_declarations(view.substr(sublime.Region(0, view.size())), path))
+      elif symbols == None:
+        parser.index_file(path, parser.get_file_key, parser.read_file_text)
+        symbols = parser.file_symbols_cache.get_latest_symbols(path)
+
+      symbol = symbols.get_symbol(name) if symbols != None else None
+      if symbol != None:
+        return symbol
+    return None
+
+  # the .odin files of the core and shared collections and of the folder tree of view. Runs on the indexer.
+  def get_workspace_paths(self, view):
+    odin_path = os.path.expanduser(view.settings().get('odin_install_path', '~/odin'))
+    paths = set()
+    for root in [os.path.join(odin_path, 'core'), os.path.join(odin_path, 'shared'), os.path.dirname(view.file_name())]:
+      index = package_index.get_index(root)
+      index.refresh()
+      paths.update(index.all_files())
+    return sorted(paths)
+
+  # indexes paths in the index helper processes (see index_pool), the open ones through their buffer models. on_done is
+  # called with the number of paths that are indexed and the seconds it took once all of them are done, which counts the
+  # files other jobs indexed in the meantime too. Runs on the indexer.
+  def index_paths_in_parallel(self, view, key, paths, on_done=None, force=False):
+    index_pool.pool.python = view.settings().get('odin_index_python', 'python' if os.name == 'nt' else 'python3')
+    index_pool.pool.processes = view.settings().get('odin_index_processes', max(1, (os.cpu_count() or 2) - 1))
+    start_time = time.time()
+    disk_paths = []
+    for path in paths:
+      if sublime.active_window().find_open_file(path) != None:
+        self.index_file_job(path)
+      else:
+        disk_paths.append(path)
+
+    def done(parsed):
+      if on_done != None:
+        indexed = sum(1 for path in paths if parser.file_symbols_cache.get_latest_symbols(path) != None)
+        on_done(indexed, time.time() - start_time)
+    index_pool.pool.submit(key, disk_paths, done, force)
 
   def on_post_save_async(self, view):
-    if time.time() - self.last_full_reindex_secs > self.full_reindex_interval_secs:
-      parser.reindex_all_package_names(view, os.path.dirname(sublime.active_window().active_view().file_name()))
-      self.last_full_reindex_secs = time.time()
+    self.save_symbol_index()
+    if is_odin_view(view):
+      # a running odin query of the folder is out of date now
+      odin_completer.completer.cancel(os.path.dirname(view.file_name()))
+      indexer.submit(('saved', view.file_name()), lambda: self.on_saved_job(view))
+
+  def on_saved_job(self, view):
+    # pick up any added/removed folders and files in the indexed package trees. The folder of the file is listed again in
+    # case its build tags changed.
+    package_index.invalidate_directory(os.path.dirname(view.file_name()))
+    package_index.refresh_all()
+    self.index_file_job(view.file_name())
+
+    # drop the cached completions of a core/shared package when one of its files is saved
+    odin_path = os.path.expanduser(view.settings().get('odin_install_path', '~/odin'))
+    folder = os.path.dirname(view.file_name())
+    for prefix in ['core', 'shared']:
+      if folder.startswith(os.path.join(odin_path, prefix) + os.sep):
+        parser.invalidate_completions(prefix + ':' + os.path.basename(folder))
+
+    # new packages are offered for auto import right away
+    package_index.update_package_paths(odin_path)
 
   def on_query_completions(self, view, prefix, locations):
-    if len(locations) > 1 or not view.file_name().endswith('.odin'):
+    if len(locations) > 1 or not is_odin_view(view):
       return None
 
-    # cleanup before we start
-    self.alias_to_package.clear()
-    self.included_core_packages.clear()
-    self.included_shared_packages.clear()
-    self.included_local_packages.clear()
-    self.before_dot = None
-    self.search_package = None
+    # every phase is timed into stats.completion_stats, see OdinCompletionStatsCommand
+    timer = stats.RequestTimer()
 
     # dont bother with completions if we are in a comment block or string
     scope_name = view.scope_name(locations[0])
     no_completion_scopes = ['quoted.double', 'quoted.raw', 'comment.line', 'comment.block']
     if any(part in scope_name for part in no_completion_scopes):
       return None
-
-    start_time = time.time()
-
-    # extract the current text. If there is a '.' get the previous word to see if it matches a package
-    file_view = sublime.active_window().find_open_file(view.file_name())
-    curr_line_region = file_view.line(locations[0])
-    curr_line = file_view.substr(curr_line_region).strip()
+    timer.mark('scope')
 
     # extract the string before the '.' in the current line if there is one and we are on the right side of it typing
-    self.before_dot = self.get_prefix_before_dot(file_view, locations[0])
-
-    self.extract_includes()
-    paths = self.get_all_odin_file_paths(view)
-    completions = []
+    line = LineSnapshot(view, locations[0])
+    before_dot = line.get_prefix_before_dot()
+    timer.mark('prefix')
+
+    imports = self.get_view_imports(view)
+    # the package we are completing (ie fmt.nnn would be 'fmt')
+    search_package = imports.resolve_package(before_dot)
+    timer.mark('imports')
+
+    # imported core/shared packages are served from the package cache. Only the current package gets rebuilt.
+    parser.completions_cache.configure(view.settings().get('odin_completion_cache_max_packages', 64),
+      view.settings().get('odin_completion_cache_max_mb', 32) * 1024 * 1024)
+    cache_key = imports.get_package_cache_key(search_package)
+    cached_index = None
+
+    # with the odin query backend the compiler results are used once they are in. Until then the parser is the fallback.
+    if view.settings().get('odin_completion_backend', 'parser') == 'odin_query' and (before_dot == None or search_package != None):
+      cached_index = self.get_query_completions(view, imports.package if before_dot == None else search_package)
+    if cached_index == None and cache_key != None:
+      cached_index = parser.completions_cache.get_completions(cache_key)
+    timer.mark('package_cache')
+
+    paths, complete = self.get_all_odin_file_paths(view, imports, before_dot) if cached_index == None else (set(), True)
+    timer.mark('paths')
+    indexes = []
 
     # if we have no . in the text on the current line add the included package names and built-ins as completions
     # TODO: add local variables
-    if self.before_dot == None:
-      for mod in self.included_local_packages:
-        alias = self.alias_for_package(mod)
-        completions.append(['Package: ' + mod, alias])
+    if before_dot == None:
+      package_completions = []
+      for mod in imports.local_packages:
+        alias = imports.alias_for_package(mod)
+        package_completions.append(['Package: ' + mod, alias])
         if alias != mod:
-          completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
-      for mod in self.included_core_packages:
-        alias = self.alias_for_package(mod)
-        completions.append(['Package: ' + mod, alias])
+          package_completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
+      for mod in imports.core_packages:
+        alias = imports.alias_for_package(mod)
+        package_completions.append(['Package: ' + mod, alias])
         if alias != mod:
-          completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
-      for mod in self.included_shared_packages:
-        alias = self.alias_for_package(mod)
-        completions.append(['Package: ' + mod, alias])
+          package_completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
+      for mod in imports.shared_packages:
+        alias = imports.alias_for_package(mod)
+        package_completions.append(['Package: ' + mod, alias])
         if alias != mod:
-          completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
-      completions.extend(self.built_in_procs)
-
-    # invalidate the cache for our current package
-    # TODO: actually cache the completions by package name
-    parser.invalidate_completions(self.current_package)
+          package_completions.append(['Package: {} (alias for {})'.format(alias, mod), alias])
+      indexes.append(parser.CompletionIndex(package_completions))
+      indexes.append(self.get_built_in_index())
+
+    # only already indexed symbols are used. A stale view is served as is and re-indexed in the background, the other open
+    # buffers are kept current by OdinBufferListener. When anything is missing the packages of the view are queued and the
+    # popup refreshed once they are indexed.
+    file_indexes = []
+    sources = []
+    view_path = view.file_name()
+    if view_path in paths:
+      symbols = parser.file_symbols_cache.get_latest_symbols(view_path)
+      if symbols == None or symbols.key != ('view', view.buffer_id(), view.change_count()):
+        self.index_file(view_path)
+        stats.completion_stats.count('stale_view_requests')
 
     for path in reversed(list(paths)):
-      package_or_filename = self.search_package or os.path.split(path)[1]
-      completions += parser.get_completions_from_file(package_or_filename, self.get_file_contents(path))
-
-    #sort completions alphabetically
-    if view.settings().get('odin_sort_completions_alphabetical', True):
-      completions.sort()
+      symbols = parser.file_symbols_cache.get_latest_symbols(path)
+      if symbols == None:
+        complete = False
+        continue
+
+      file_indexes.append(symbols.get_completion_index())
+      sources.append((path, symbols))
+    timer.mark('symbols')
+
+    # overload groups whose variants live in other files of the package
+    if cached_index == None:
+      overload_symbols = parser.make_package_overload_symbols([symbols for _, symbols in sources])
+      if len(overload_symbols) > 0:
+        file_indexes.append(parser.CompletionIndex(overload_symbols))
+      timer.mark('overloads')
+
+    # the package cache is only filled in on the indexer, until then the indexes of the files are merged by the query
+    if cached_index != None:
+      indexes.append(cached_index)
+    else:
+      indexes.extend(file_indexes)
+      if cache_key != None and complete:
+        package_paths = [path for path, _ in sources]
+        indexer.submit(('package', cache_key), lambda: self.cache_package_completions(cache_key, package_paths))
+
+    if not complete:
+      self.index_view_packages(view)
+      self.refresh_completions_when_indexed(view)
+      stats.completion_stats.count('incomplete_requests')
+
+    # only the completions whose name starts with the typed prefix are returned, merged from the presorted indexes and
+    # capped. When capped Sublime is asked to query again as the prefix grows so nothing is out of reach. Symbols are shown
+    # with the package when completing one, else with their file name.
+    completions, truncated = parser.merge_completions(indexes, prefix, view.settings().get('odin_completion_limit', 500),
+      view.settings().get('odin_sort_completions_alphabetical', True), search_package)
+    timer.mark('merge')
+    if truncated:
+      stats.completion_stats.count('truncated_requests')
+
+    # requests slower than odin_slow_completion_ms are logged with the files they went through
+    details = lambda: '{} package: {} completions: {} paths: {}'.format(view.file_name(), search_package or '-',
+      len(completions), ', '.join(sorted(paths)[:20]) + (' ...' if len(paths) > 20 else ''))
+    slow_request = stats.completion_stats.add_request(timer, view.settings().get('odin_slow_completion_ms', 0), details)
+    if slow_request != None:
+      print('Odin: slow completion ' + slow_request)
 
     # Report time spent building completions before returning
-    delta_time_ms = int((time.time() - start_time) * 1000)
-    message = 'Odin autocompletion took ' + str(delta_time_ms) + 'ms. Completions: ' + str(len(completions)) + '. Paths: ' + str(len(paths))
+    message = 'Odin autocompletion took ' + str(int(timer.total_ms())) + 'ms. Completions: ' + str(len(completions)) + ('+' if truncated else '') + '. Paths: ' + str(len(paths))
     view.window().status_message(message)
 
-
-
+    if truncated:
+      return (completions, getattr(sublime, 'DYNAMIC_COMPLETIONS', 0))
     return completions
 
 
+# jumps to the declaration of the word under the cursor (or under the mouse from the context menu). 'alias.name' goes
+# through the import aliases of the file to the package, a bare name is looked up in the current package. Anything the
+# index does not know about (locals, fields) is left to Sublime's own goto_definition.
+class OdinGotoDefinitionCommand(sublime_plugin.TextCommand):
+  def is_enabled(self, event=None):
+    return is_odin_view(self.view)
+
+  def is_visible(self, event=None):
+    return is_odin_view(self.view)
+
+  def want_event(self):
+    return True
+
+  def run(self, edit, event=None):
+    view = self.view
+    location = view.window_to_text((event['x'], event['y'])) if event != None else view.sel()[0].b
+    word = view.word(location)
+    name = view.substr(word)
+    before_dot = LineSnapshot(view, word.end()).get_prefix_before_dot()
+
+    symbol = None
+    if name.isidentifier() and before_dot != '':
+      symbol = OdinCompletions().find_declaration(view, name, before_dot)
+    if symbol == None:
+      view.window().run_command('goto_definition')
+      return
+
+    open_symbol(view.window(), symbol)
+
+
+# fuzzy search over the declarations of every core, shared and project package. The best matches are listed in a popup
+# while typing and enter lists all of them in a quick panel to pick from. Symbols of the current package and of the
+# packages the file imports are ranked first.
+class OdinSearchSymbolsCommand(sublime_plugin.TextCommand):
+  max_results = 100
+  popup_results = 12
+
+  def is_enabled(self):
+    return is_odin_view(self.view)
+
+  def is_visible(self):
+    return is_odin_view(self.view)
+
+  def run(self, edit):
+    view = self.view
+    listener = OdinCompletions()
+    view.window().status_message('Odin: indexing symbols...')
+
+    def index():
+      paths = listener.get_workspace_paths(view)
+      listener.index_paths_in_parallel(view, ('search', view.id()), paths, lambda count, secs: indexed(paths))
+
+    def indexed(paths):
+      files = dict()
+      for path in paths:
+        symbols = parser.file_symbols_cache.get_latest_symbols(path)
+        if symbols != None:
+          files[path] = symbols
+      search_index = parser.get_symbol_search_index(files)
+      sublime.set_timeout(lambda: self.show_input(search_index, listener.get_view_imports(view)))
+    indexer.submit(('search', view.id()), index)
+
+  def show_input(self, index, imports):
+    self.index = index
+    self.packages = set([imports.package] + imports.core_packages + imports.shared_packages + imports.local_packages)
+    self.results = []
+    self.view.window().status_message('Odin: {} symbols'.format(len(index)))
+    self.view.window().show_input_panel('Odin symbol:', '', self.on_done, self.on_change, self.view.hide_popup)
+
+  def describe(self, symbol):
+    return '{} {} - {}:{}'.format(symbol.kind, symbol.package, os.path.basename(symbol.file), symbol.line + 1)
+
+  def on_change(self, text):
+    self.results = self.index.search(text, self.max_results, self.packages)
+    if len(self.results) == 0:
+      self.view.hide_popup()
+      return
+
+    rows = ''.join('<div><a href="{}">{}</a> <i>{}</i></div>'.format(i, html.escape(symbol.name), html.escape(self.describe(symbol)))
+      for i, symbol in enumerate(self.results[:self.popup_results]))
+    content = '<body style="border: 2px solid white; margin: 0px; padding: 4px;">{}</body>'.format(rows)
+    self.view.show_popup(content, 0, -1, 800, 400, self.on_navigate)
+
+  def on_navigate(self, href):
+    window = self.view.window()
+    window.run_command('hide_panel', {'cancel': True})
+    open_symbol(window, self.results[int(href)])
+
+  def on_done(self, text):
+    self.view.hide_popup()
+    results = self.results
+    if len(results) == 0:
+      return
+
+    window = self.view.window()
+    items = [[symbol.name, self.describe(symbol)] for symbol in results]
+    window.show_quick_panel(items, lambda i: open_symbol(window, results[i]) if i >= 0 else None, 0, 0,
+      lambda i: open_symbol(window, results[i], sublime.TRANSIENT))
+
+
+# parses every file of the core and shared collections and of the project again, in parallel in the index helper
+# processes
+class OdinReindexAllCommand(sublime_plugin.TextCommand):
+  def is_enabled(self):
+    return is_odin_view(self.view)
+
+  def is_visible(self):
+    return is_odin_view(self.view)
+
+  def run(self, edit):
+    view = self.view
+    listener = OdinCompletions()
+    window = view.window()
+    window.status_message('Odin: indexing...')
+
+    def indexed(count, secs):
+      sublime.set_timeout(lambda: window.status_message('Odin: indexed {} files in {:.1f}s'.format(count, secs)))
+    indexer.submit('reindex_all', lambda: listener.index_paths_in_parallel(view, 'reindex_all', listener.get_workspace_paths(view), indexed, True))
+
+
+# dumps the latency percentiles of every phase of the completion path and of the background indexing, the cache hit
+# rates and the last slow requests to an output panel. reset clears them.
+class OdinCompletionStatsCommand(sublime_plugin.WindowCommand):
+  # only offered in the menus of Odin views, the stats are for the whole window though
+  def is_visible(self, reset=False):
+    view = self.window.active_view()
+    return view != None and is_odin_view(view)
+
+  def run(self, reset=False):
+    if reset:
+      stats.completion_stats.reset()
+      parser.completions_cache.hits = parser.completions_cache.misses = parser.completions_cache.evictions = 0
+      parser.file_contents_cache.hits = parser.file_contents_cache.misses = 0
+      self.window.status_message('Odin: completion stats reset')
+      return
+
+    cache = parser.completions_cache.stats()
+    lookups = cache['hits'] + cache['misses']
+    contents = parser.file_contents_cache.stats()
+    reads = contents['hits'] + contents['misses']
+    extra_counters = [
+      ('package_cache_hits', cache['hits']),
+      ('package_cache_misses', cache['misses']),
+      ('package_cache_hit_rate', '{:.1f}%'.format(100.0 * cache['hits'] / lookups if lookups > 0 else 0)),
+      ('package_cache_evictions', cache['evictions']),
+      ('package_cache_packages', cache['packages']),
+      ('package_cache_kb', cache['bytes'] // 1024),
+      ('file_cache_hits', contents['hits']),
+      ('file_cache_misses', contents['misses']),
+      ('file_cache_hit_rate', '{:.1f}%'.format(100.0 * contents['hits'] / reads if reads > 0 else 0)),
+      ('file_cache_files', contents['files']),
+      ('file_cache_kb', contents['bytes'] // 1024),
+      ('indexed_files', len(parser.file_symbols_cache.entries))
+    ]
+
+    panel = self.window.create_output_panel('odin_stats')
+    panel.run_command('append', {'characters': stats.completion_stats.report(extra_counters)})
+    self.window.run_command('show_panel', {'panel': 'output.odin_stats'})
+
+
+stats.completion_stats.add('plugin_import', (time.perf_counter() - plugin_import_start_secs) * 1000)
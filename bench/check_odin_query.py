@@ -0,0 +1,121 @@
+# Checks the `odin query` completion backend (odin_completer.py) against fake_odin.py instead of a real compiler:
+#
+#	python bench/check_odin_query.py
+#
+# Covers turning the JSON into completions, running the query only once per version of the sources, the timeout and
+# cancelling a running query. Exits with 1 when a check fails.
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import run_benchmarks
+
+fake_odin_path = os.path.join(run_benchmarks.bench_dir, 'fake_odin.py')
+
+
+# an `odin` executable in folder that runs fake_odin.py with this Python
+def write_fake_odin(folder):
+	if os.name == 'nt':
+		path = os.path.join(folder, 'odin.bat')
+		with open(path, 'w') as f:
+			f.write('@"{}" "{}" %*\n'.format(sys.executable, fake_odin_path))
+	else:
+		path = os.path.join(folder, 'odin')
+		with open(path, 'w') as f:
+			f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, fake_odin_path))
+		os.chmod(path, 0o755)
+	return path
+
+
+def count_calls(calls_path):
+	if not os.path.exists(calls_path):
+		return 0
+	with open(calls_path) as f:
+		return len(f.readlines())
+
+
+def check(name, ok, details=''):
+	print('{:<40} {}{}'.format(name, 'ok' if ok else 'FAILED', '' if ok else ' ' + str(details)))
+	return ok
+
+
+def run_checks(work_dir):
+	from Odin import odin_completer
+
+	project = os.path.join(work_dir, 'project')
+	os.makedirs(project)
+	with open(os.path.join(project, 'main.odin'), 'w') as f:
+		f.write('package main\n')
+	calls_path = os.path.join(work_dir, 'calls.log')
+	os.environ['FAKE_ODIN_CALLS'] = calls_path
+	os.environ.pop('FAKE_ODIN_SLEEP', None)
+
+	completer = odin_completer.Completer(write_fake_odin(work_dir), timeout_secs=10)
+	results = []
+	try:
+		# the JSON is turned into a CompletionIndex of Symbols per package
+		completer.get_completions(project)
+		completer.worker.wait_idle()
+		completions = completer.get_completions(project)
+		completer.worker.wait_idle()
+		symbols = dict((s.name, s) for index in (completions or {}).values() for s in index.completions)
+		do_stuff = symbols.get('do_stuff')
+		results.append(check('make_completions packages', completions != None and sorted(completions) == ['fmt', 'main'], completions))
+		results.append(check('make_completions kinds', dict((n, s.kind) for n, s in symbols.items()) == {'do_stuff': 'proc', 'Thing': 'type',
+			'MAX': 'const', 'counter': 'var', 'println': 'proc', 'print_any': 'overload'}, symbols))
+		results.append(check('make_completions proc signature', do_stuff != None and do_stuff.signature ==
+			(('a: int', 'cb: proc(x, y: int) -> bool'), '(int, bool)'), do_stuff and do_stuff.signature))
+		results.append(check('make_completions location', do_stuff != None and (do_stuff.offset, do_stuff.line, do_stuff.column) == (14, 2, 0),
+			do_stuff and (do_stuff.offset, do_stuff.line, do_stuff.column)))
+
+		# unchanged sources are never queried again, changed ones are
+		results.append(check('query once per sources hash', count_calls(calls_path) == 1, count_calls(calls_path)))
+		with open(os.path.join(project, 'other.odin'), 'w') as f:
+			f.write('package main\n')
+		completer.get_completions(project)
+		completer.worker.wait_idle()
+		results.append(check('query again when sources change', count_calls(calls_path) == 2, count_calls(calls_path)))
+
+		# a query slower than the timeout is killed and counts as failed until the sources change
+		os.environ['FAKE_ODIN_SLEEP'] = '5'
+		completer.timeout_secs = 0.5
+		completer.results_by_folder.clear()
+		started = time.time()
+		completer.get_completions(project)
+		completer.worker.wait_idle()
+		entry = completer.results_by_folder.get(project)
+		results.append(check('timeout kills the query', time.time() - started < 3 and entry != None and entry[1] == None, entry))
+		retried = completer.get_completions(project)
+		completer.worker.wait_idle()
+		results.append(check('timed out query is not retried', retried == None and count_calls(calls_path) == 3, count_calls(calls_path)))
+
+		# cancelling kills the running query and drops its result
+		completer.timeout_secs = 10
+		completer.results_by_folder.clear()
+		started = time.time()
+		completer.get_completions(project)
+		time.sleep(0.5)
+		completer.cancel(project)
+		completer.worker.wait_idle()
+		results.append(check('cancel kills the query', time.time() - started < 3 and project not in completer.results_by_folder,
+			completer.results_by_folder))
+	finally:
+		completer.stop()
+		os.environ.pop('FAKE_ODIN_SLEEP', None)
+	return all(results)
+
+
+def main():
+	work_dir = tempfile.mkdtemp(prefix='odin_query_check_')
+	try:
+		run_benchmarks.import_plugin(work_dir)
+		ok = run_checks(work_dir)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+	return 0 if ok else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
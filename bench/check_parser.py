@@ -0,0 +1,122 @@
+# Checks the declaration scanner (parser.scan_declarations) on fixed cases and the incremental re-scan of open buffers
+# (parser.BufferModel.apply_edit) against a full scan after every edit of random edit sequences:
+#
+#	python bench/check_parser.py
+#
+# Names, kinds, signatures, offsets, lines and columns must all match. Exits with 1 when a check fails.
+import random
+import shutil
+import sys
+import tempfile
+
+import run_benchmarks
+
+# text -> the (name, kind, signature, offset, line, column) of its declarations
+scanner_cases = [
+	('overloads', 'add :: proc{add_int, add_f32}\nadd_int :: proc(a, b: int) -> int { return a + b }\n', [
+		('add', 'overload', ('add_int', 'add_f32'), 0, 0, 0),
+		('add_int', 'proc', (('a', 'b: int'), 'int'), 30, 1, 0)]),
+	('where clause', 'clamp :: proc(x: $T, lo, hi: T) -> T where intrinsics.type_is_numeric(T) {\n\treturn x\n}\n', [
+		('clamp', 'proc', (('x: $T', 'lo', 'hi: T'), 'T'), 0, 0, 0)]),
+	('proc typed params', 'map_all :: proc(xs: []int, f: proc(x: int) -> int, g: proc "c" (p: rawptr)) -> (out: []int, ok: bool) {\n}\n', [
+		('map_all', 'proc', (('xs: []int', 'f: proc(x: int) -> int', 'g: proc "c" (p: rawptr)'), '(out: []int, ok: bool)'), 0, 0, 0)]),
+	('foreign block', 'foreign import lib "system:c"\nforeign lib {\n\tputs :: proc "c" (s: cstring) -> c.int ---\n'
+		'\t@(link_name="free") c_free :: proc "c" (p: rawptr) ---\n}\n', [
+		('puts', 'proc', (('s: cstring',), 'c.int'), 45, 2, 1),
+		('c_free', 'proc', (('p: rawptr',), None), 109, 3, 21)]),
+	('strings and comments', '// fake :: proc() {}\n/* also_fake :: proc() {} /* nested */ still :: 1 */\nmsg :: "not :: a decl"\n'
+		'raw :: `fake2 :: proc()`\nr :: \'"\'\nreal :: proc() {}\n', [
+		('real', 'proc', ((), None), 131, 5, 0)]),
+	('types and consts', 'Vec :: struct { x, y: f32 }\nKind :: enum u8 { A, B }\nMAX :: 16\nHandle :: distinct u32\nFlags :: bit_set[Kind]\n', [
+		('Vec', 'type', 'struct', 0, 0, 0),
+		('Kind', 'type', 'enum', 28, 1, 0),
+		('MAX', 'const', None, 53, 2, 0),
+		('Handle', 'type', 'distinct', 63, 3, 0),
+		('Flags', 'type', 'bit_set', 86, 4, 0)]),
+	('when blocks', 'when ODIN_OS == .Windows {\n\tplat :: proc() -> string { return "w" }\n} else {\n\tplat :: proc() -> string { return "o" }\n}\n', [
+		('plat', 'proc', ((), 'string'), 28, 1, 1),
+		('plat', 'proc', ((), 'string'), 78, 3, 1)]),
+	('locals and directives', 'outer :: proc() {\n\tinner :: proc() {}\n\tLOCAL :: 3\n}\nafter :: #force_inline proc(a := "x, y") {}\n', [
+		('outer', 'proc', ((), None), 0, 0, 0),
+		('after', 'proc', (('a := "x, y"',), None), 52, 4, 0)])
+]
+
+# what the random edits insert: the tokens that open or close strings, comments and blocks are the ones that can move
+# the start or end of a declaration far from the edit
+edit_snippets = ['x', ' ', '\n', '\t', '"', '`', "'", '\\', '/*', '*/', '//', '{', '}', '(', ')', '[', ']', ',', '::', ' :: ',
+	'proc', 'proc(', ') -> int', 'struct {', 'foreign lib {', 'when X {', '---', 'where', '#force_inline ', 'name :: proc(a: int) {\n}\n',
+	'CONST :: 3\n', 'grp :: proc{a, b}\n', 'T :: struct { x: int }\n']
+edit_sequences = 300
+edits_per_sequence = 30
+
+
+def describe(symbols):
+	return [(s.name, s.kind, s.signature, s.offset, s.line, s.column) for s in symbols]
+
+
+def check(name, ok, details=''):
+	print('{:<40} {}{}'.format(name, 'ok' if ok else 'FAILED', '' if ok else ' ' + str(details)))
+	return ok
+
+
+def random_edit(rng, text):
+	begin = rng.randint(0, len(text))
+	end = min(len(text), begin + (rng.randint(0, 40) if rng.random() < 0.4 else 0))
+	if rng.random() < 0.2 and len(text) > 0:
+		# pastes a piece of the file, which may hold whole declarations
+		start = rng.randint(0, len(text) - 1)
+		replacement = text[start:start + rng.randint(1, 120)]
+	else:
+		replacement = ''.join(rng.choice(edit_snippets) for _ in range(rng.randint(0, 3)))
+	return begin, end, replacement
+
+
+# applies random edits to a buffer model of a generated file and compares it to a full scan after each of them. Returns
+# None or the first mismatch.
+def fuzz_buffer_model(parser, rng, sequence):
+	text = run_benchmarks.generate_odin_file(rng, 'fuzz', rng.randint(5, 120), overload_groups=rng.randint(0, 3))
+	model = parser.BufferModel(text, 0, 'fuzz/fuzz.odin')
+	edits = []
+	for _ in range(edits_per_sequence):
+		edit = random_edit(rng, model.text)
+		edits.append(edit)
+		model.apply_edit(*edit)
+		expected = describe(parser.scan_declarations(model.text, 'fuzz/fuzz.odin'))
+		actual = describe(model.declarations)
+		if actual != expected:
+			missing = [d for d in expected if d not in actual][:3]
+			extra = [d for d in actual if d not in expected][:3]
+			return 'sequence {} edit {} {!r}: missing {} extra {}'.format(sequence, len(edits), edit, missing, extra)
+	return None
+
+
+def run_checks(seed):
+	from Odin import parser
+
+	results = []
+	for name, text, expected in scanner_cases:
+		actual = describe(parser.scan_declarations(text))
+		results.append(check('scan ' + name, actual == expected, actual))
+		model = parser.BufferModel(text, 0, 'case.odin')
+		results.append(check('buffer model ' + name, describe(model.declarations) == expected, describe(model.declarations)))
+
+	rng = random.Random(seed)
+	failures = [f for f in (fuzz_buffer_model(parser, rng, i) for i in range(edit_sequences)) if f != None]
+	results.append(check('incremental == full scan ({} x {} edits)'.format(edit_sequences, edits_per_sequence), len(failures) == 0,
+		'{} sequence(s) differ, seed {}, first {}'.format(len(failures), seed, failures[:1])))
+	return all(results)
+
+
+def main():
+	seed = int(sys.argv[1]) if len(sys.argv) > 1 else 11
+	work_dir = tempfile.mkdtemp(prefix='odin_parser_check_')
+	try:
+		run_benchmarks.import_plugin(work_dir)
+		ok = run_checks(seed)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+	return 0 if ok else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,40 @@
+# Stand-in for `odin query <folder> -global-definitions` that prints a fixed result in the documented JSON format (see
+# the top of odin_completer.py). Used by check_odin_query.py.
+#
+#	FAKE_ODIN_SLEEP=3       sleep that many seconds before answering, to test timeouts and cancelling
+#	FAKE_ODIN_CALLS=<path>  append the arguments of every call to this file
+import json
+import os
+import sys
+import time
+
+
+def main():
+	if os.environ.get('FAKE_ODIN_CALLS'):
+		with open(os.environ['FAKE_ODIN_CALLS'], 'a') as f:
+			f.write(' '.join(sys.argv[1:]) + '\n')
+	if os.environ.get('FAKE_ODIN_SLEEP'):
+		time.sleep(float(os.environ['FAKE_ODIN_SLEEP']))
+
+	folder = sys.argv[2] if len(sys.argv) > 2 else '.'
+	main_file = os.path.join(folder, 'main.odin')
+	print(json.dumps({
+		'packages': [
+			{'name': 'main', 'fullpath': folder, 'files': [main_file]},
+			{'name': 'fmt', 'fullpath': os.path.join(folder, 'fmt'), 'files': []}
+		],
+		'definitions': [
+			{'package': 'main', 'name': 'do_stuff', 'kind': 'procedure', 'type': 'proc(a: int, cb: proc(x, y: int) -> bool) -> (int, bool)',
+				'filepath': main_file, 'line': 3, 'column': 1, 'file_offset': 14},
+			{'package': 'main', 'name': 'Thing', 'kind': 'type name', 'type_kind': 'struct', 'type': 'Thing', 'filepath': main_file, 'line': 5,
+				'column': 1, 'file_offset': 60},
+			{'package': 'main', 'name': 'MAX', 'kind': 'constant', 'filepath': main_file, 'line': 6, 'column': 1, 'file_offset': 80},
+			{'package': 'main', 'name': 'counter', 'kind': 'variable', 'type': 'int', 'filepath': main_file, 'line': 7, 'column': 1, 'file_offset': 90},
+			{'package': 'fmt', 'name': 'println', 'kind': 'procedure', 'type': 'proc(args: ..any, sep := " ") -> int'},
+			{'package': 'fmt', 'name': 'print_any', 'kind': 'procedure group'}
+		]
+	}))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,325 @@
+# Benchmarks for the completion pipeline. Runs outside of Sublime against the stub sublime modules in this folder.
+#
+#	python bench/run_benchmarks.py                      run and compare against bench/baseline.json
+#	python bench/run_benchmarks.py --save-baseline      run and store the results as the new baseline
+#	python bench/run_benchmarks.py --odin-path ~/odin   use a real Odin install as the core/shared corpus
+#	python bench/run_benchmarks.py --filter parse       only run the benchmarks whose name contains 'parse'
+#
+# Each benchmark reports ops/sec, p50/p95 latency and peak memory. The run fails (exit code 1) when the p50 of any
+# benchmark is more than --tolerance slower than the saved baseline.
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.dirname(bench_dir)
+default_baseline_path = os.path.join(bench_dir, 'baseline.json')
+
+
+# the plugin imports itself as 'Odin' so we expose the package folder under that name before importing it
+def import_plugin(temp_dir):
+	sys.path.insert(0, bench_dir)
+	if os.path.basename(package_dir) == 'Odin':
+		sys.path.insert(0, os.path.dirname(package_dir))
+	else:
+		os.symlink(package_dir, os.path.join(temp_dir, 'Odin'), target_is_directory=True)
+		sys.path.insert(0, temp_dir)
+
+	global sublime, parser, indexer, package_index, OdinCompletions
+	import sublime
+	from Odin import parser
+	from Odin import indexer
+	from Odin import package_index
+	from Odin import OdinCompletions
+
+
+# corpus generation
+
+def random_name(rng, prefix=''):
+	parts = ['get', 'set', 'make', 'draw', 'update', 'buffer', 'vertex', 'index', 'read', 'write', 'push', 'pop', 'clear', 'text', 'color', 'matrix']
+	return prefix + '_'.join(rng.choice(parts) for _ in range(rng.randint(1, 3)))
+
+
+def generate_odin_file(rng, package, lines, overload_groups=0):
+	out = ['package ' + package, '', 'import "core:fmt"', 'import "core:mem"', '']
+	procs = []
+	n = 0
+	while len(out) < lines:
+		kind = rng.random()
+		n += 1
+		name = '{}_{}'.format(random_name(rng), n)
+		if kind < 0.55:
+			procs.append(name)
+			out.append('// {} does a thing, (really: it does) :: "not a decl"'.format(name))
+			out.append('{} :: proc(a: int, b: ^[4]f32, cb: proc(x, y: int) -> bool, sep := ", ") -> (int, bool) {{'.format(name))
+			out.append('\tlocal :: proc(v: int) -> int { return v * 2 }')
+			out.append('\tif a > 0 { fmt.println("{}", b[0]) }')
+			out.append('\treturn local(a), cb(a, 1)')
+			out.append('}')
+		elif kind < 0.7:
+			out.append('{} :: struct {{'.format(name.title()))
+			out.append('\tx, y: f32,')
+			out.append('\tnext: ^{},'.format(name.title()))
+			out.append('}')
+		elif kind < 0.8:
+			out.append('{} :: enum u8 {{ A, B, C }}'.format(name.title()))
+		elif kind < 0.9:
+			out.append('{} :: {}'.format(name.upper(), rng.randint(0, 1000)))
+		else:
+			procs.append(name)
+			out.append('foreign lib {')
+			out.append('\t{} :: proc "c" (handle: rawptr, size: c.int) -> c.int ---'.format(name))
+			out.append('}')
+
+	for i in range(overload_groups):
+		variants = rng.sample(procs, min(4, len(procs)))
+		out.append('overload_{} :: proc{{{}}}'.format(i, ', '.join(variants)))
+	return '\n'.join(out) + '\n'
+
+
+# writes a core/shared like install: core/<package>/<file>.odin and shared/engine/<package>/<file>.odin
+def generate_install(rng, root):
+	packages = {
+		'core': ['fmt', 'mem', 'os', 'strings', 'strconv', 'math', 'math/linalg', 'sort', 'slice', 'time', 'runtime', 'builtin'],
+		'shared': ['engine/gfx', 'engine/input', 'engine/audio', 'engine/libs/sokol', 'engine/libs/imgui']
+	}
+	for collection, names in packages.items():
+		for name in names:
+			folder = os.path.join(root, collection, name)
+			os.makedirs(folder)
+			for i in range(4):
+				file_name = 'builtin.odin' if name == 'builtin' and i == 0 else '{}_{}.odin'.format(os.path.basename(name), i)
+				with open(os.path.join(folder, file_name), 'w', encoding='utf-8') as f:
+					f.write(generate_odin_file(rng, os.path.basename(name), 400, overload_groups=20 if name == 'math/linalg' else 0))
+
+
+def generate_project(rng, root):
+	os.makedirs(root)
+	main = generate_odin_file(rng, 'main', 300)
+	main = main.replace('import "core:mem"', 'import "core:mem"\nimport la "core:math/linalg"\nimport "core:strings"\nimport "shared:engine/gfx"')
+	main += '\nfoo :: proc() {\n\tfmt.\n\tx\n}\n'
+	with open(os.path.join(root, 'main.odin'), 'w', encoding='utf-8') as f:
+		f.write(main)
+	for i in range(3):
+		with open(os.path.join(root, 'other_{}.odin'.format(i)), 'w', encoding='utf-8') as f:
+			f.write(generate_odin_file(rng, 'main', 300))
+	return os.path.join(root, 'main.odin')
+
+
+# measurement
+
+def measure(fn, setup=None, min_iterations=5, min_seconds=0.5, max_iterations=2000):
+	samples = []
+	started = time.perf_counter()
+	while len(samples) < max_iterations and (len(samples) < min_iterations or time.perf_counter() - started < min_seconds):
+		if setup != None:
+			setup()
+		t = time.perf_counter()
+		fn()
+		samples.append(time.perf_counter() - t)
+
+	# peak memory is measured on a separate run since tracemalloc slows everything down
+	if setup != None:
+		setup()
+	tracemalloc.start()
+	fn()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	samples.sort()
+	return {
+		'iterations': len(samples),
+		'ops_per_sec': len(samples) / sum(samples) if sum(samples) > 0 else 0.0,
+		'p50_ms': samples[len(samples) // 2] * 1000,
+		'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+		'peak_kb': peak / 1024
+	}
+
+
+def clear_caches():
+	indexer.wait_idle()
+	parser.file_symbols_cache.entries.clear()
+	parser.completions_cache.completions_by_package.clear()
+	parser.completions_cache.size_by_package.clear()
+	parser.completions_cache.total_bytes = 0
+
+
+def make_query(main_path, odin_path, marker, prefix=''):
+	window = sublime.active_window()
+	with open(main_path, encoding='utf-8') as f:
+		text = f.read()
+	settings = {'odin_install_path': odin_path, 'odin_prompt_for_package_import': False}
+	window.open_views = []
+	view = window.new_view(main_path, text, settings)
+	location = text.rindex(marker) + len(marker)
+	listener = OdinCompletions.OdinCompletions()
+
+	def query():
+		return listener.on_query_completions(view, prefix, [location])
+	return query
+
+
+# types a character in the middle of a proc body and deletes it again, keeping the buffer model up to date
+def edit_buffer_model(text):
+	model = parser.BufferModel(text, 0, 'bench.odin')
+	location = text.index('\treturn', len(text) // 2)
+
+	def edit():
+		model.apply_edit(location, location, 'x')
+		model.apply_edit(location, location + 1, '')
+	return edit
+
+
+# the workspace symbol search over 100k symbols in 200 packages, ranking 3 of them first
+def make_symbol_search():
+	rng = random.Random(17)
+	symbols = [parser.Symbol('{}_{}'.format(random_name(rng), i), 'proc', 'package_{}'.format(i % 200), ((), None), 'bench.odin', 0)
+		for i in range(100000)]
+	return parser.SymbolSearchIndex(symbols), set(['package_1', 'package_2', 'package_3'])
+
+
+# types query into the symbol search one character at a time
+def type_symbol_search(index, packages, query):
+	def search():
+		for i in range(1, len(query) + 1):
+			index.search(query[:i], 100, packages)
+	return search
+
+
+# swaps the 20 symbols of a re-indexed file in the search index and back
+def update_symbol_search(index):
+	old = [symbols[0] for symbols in index.symbols[:20]]
+	new = [parser.Symbol(s.name, s.kind, s.package, s.signature, s.file, s.offset) for s in old]
+
+	def update():
+		index.update(old, new)
+		index.update(new, old)
+	return update
+
+
+# completions are built from what the background indexer has done so far. This measures the time until a query that came
+# back incomplete has all its results, which is when the deferred popup refresh fires in the editor.
+def until_indexed(query):
+	def run():
+		completions = query()
+		if not indexer.is_idle():
+			indexer.wait_idle()
+			completions = query()
+		return completions
+	return run
+
+
+def run_benchmarks(odin_path, work_dir, name_filter):
+	rng = random.Random(31)
+	files = dict((lines, generate_odin_file(rng, 'bench', lines)) for lines in [1000, 10000, 100000])
+	overloads = generate_odin_file(rng, 'linalg', 3000, overload_groups=400)
+
+	if odin_path == None:
+		odin_path = os.path.join(work_dir, 'odin')
+		generate_install(rng, odin_path)
+	main_path = generate_project(rng, os.path.join(work_dir, 'project'))
+
+	benchmarks = []
+	for lines, text in sorted(files.items()):
+		benchmarks.append(('parse_file_{}k_lines'.format(lines // 1000), lambda text=text: parser.get_completions_from_file('bench', text), None))
+	benchmarks.append(('type_and_const_10k_lines', lambda: parser.get_type_and_const_completions('bench', files[10000]), None))
+	benchmarks.append(('overload_expansion_400_groups', lambda: parser.get_completions_from_file('linalg', overloads), None))
+	benchmarks.append(('buffer_edit_10k_lines', edit_buffer_model(files[10000]), None))
+	# building the search index takes a while so it is skipped when filtered out. Besides typing a name the single
+	# searches are the keystrokes that are neither short nor a prefix of many names.
+	search_queries = ['d', 'e', 'ae', 'et', 'rwt', 'mxi']
+	search_names = ['symbol_search_100k_7_keys', 'symbol_search_update_file'] + ['symbol_search_100k_' + q for q in search_queries]
+	if any(name_filter in name for name in search_names):
+		search_index, search_packages = make_symbol_search()
+		benchmarks.append(('symbol_search_100k_7_keys', type_symbol_search(search_index, search_packages, 'draw_tx'), None))
+		for query in search_queries:
+			benchmarks.append(('symbol_search_100k_' + query, lambda query=query: search_index.search(query, 100, search_packages), None))
+		benchmarks.append(('symbol_search_update_file', update_symbol_search(search_index), None))
+
+	naked_query = make_query(main_path, odin_path, '\tx')
+	benchmarks.append(('query_naked_cold', naked_query, clear_caches))
+	benchmarks.append(('query_naked_warm', naked_query, None))
+	benchmarks.append(('query_naked_until_indexed', until_indexed(naked_query), clear_caches))
+	dotted_query = make_query(main_path, odin_path, 'fmt.')
+	benchmarks.append(('query_dotted_core_cold', dotted_query, clear_caches))
+	benchmarks.append(('query_dotted_core_warm', dotted_query, None))
+	benchmarks.append(('query_dotted_core_until_indexed', until_indexed(dotted_query), clear_caches))
+	prefix_query = make_query(main_path, odin_path, '\tx', 'dr')
+	benchmarks.append(('query_naked_prefix_warm', prefix_query, None))
+	# what every save and view activation pays to pick up new core/shared packages when nothing changed
+	benchmarks.append(('package_paths_refresh', lambda: package_index.update_package_paths(odin_path), None))
+
+	results = {}
+	for name, fn, setup in benchmarks:
+		if name_filter and name_filter not in name:
+			continue
+		results[name] = measure(fn, setup)
+		print_result(name, results[name])
+	return results
+
+
+def print_result(name, result):
+	line = '{:<32} {:>10.1f} ops/s  p50 {:>9.2f}ms  p95 {:>9.2f}ms  peak {:>9.0f}kb'.format(
+		name, result['ops_per_sec'], result['p50_ms'], result['p95_ms'], result['peak_kb'])
+	print(line)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+	regressions = []
+	print('\nvs baseline (tolerance {:.0f}%):'.format(tolerance * 100))
+	for name, result in sorted(results.items()):
+		if name not in baseline:
+			print('{:<32} (no baseline)'.format(name))
+			continue
+		change = result['p50_ms'] / baseline[name]['p50_ms'] - 1 if baseline[name]['p50_ms'] > 0 else 0
+		flag = 'REGRESSION' if change > tolerance else ''
+		print('{:<32} p50 {:>9.2f}ms -> {:>9.2f}ms  {:>+7.1f}%  {}'.format(name, baseline[name]['p50_ms'], result['p50_ms'], change * 100, flag))
+		if change > tolerance:
+			regressions.append(name)
+	return regressions
+
+
+def main():
+	args = argparse.ArgumentParser(description='Benchmarks for the Odin completion pipeline')
+	args.add_argument('--odin-path', help='use a real Odin install instead of the generated core/shared corpus')
+	args.add_argument('--baseline', default=default_baseline_path, help='baseline results file')
+	args.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+	args.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown before failing, 0.25 = 25%%')
+	args.add_argument('--filter', default='', help='only run benchmarks whose name contains this string')
+	args = args.parse_args()
+
+	work_dir = tempfile.mkdtemp(prefix='odin_bench_')
+	try:
+		import_plugin(work_dir)
+		odin_path = os.path.expanduser(args.odin_path) if args.odin_path else None
+		results = run_benchmarks(odin_path, work_dir, args.filter)
+	finally:
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+	if args.save_baseline:
+		with open(args.baseline, 'w') as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+		print('\nsaved baseline to ' + args.baseline)
+		return 0
+
+	if not os.path.exists(args.baseline):
+		print('\nno baseline found at {}, run with --save-baseline to create one'.format(args.baseline))
+		return 0
+
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	regressions = compare_to_baseline(results, baseline, args.tolerance)
+	if len(regressions) > 0:
+		print('\n{} benchmark(s) regressed: {}'.format(len(regressions), ', '.join(regressions)))
+		return 1
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
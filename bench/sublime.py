@@ -0,0 +1,193 @@
+# minimal stand-in for the Sublime Text API so that the plugin modules can be imported and driven outside of the editor.
+# Only what the completion pipeline touches is implemented.
+import os
+
+HIDE_ON_MOUSE_MOVE_AWAY = 2
+ENCODED_POSITION = 1
+INHIBIT_WORD_COMPLETIONS = 8
+INHIBIT_EXPLICIT_COMPLETIONS = 16
+DYNAMIC_COMPLETIONS = 32
+
+_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+class Region(object):
+	def __init__(self, a, b=None):
+		self.a = a
+		self.b = a if b == None else b
+
+	def begin(self):
+		return min(self.a, self.b)
+
+	def end(self):
+		return max(self.a, self.b)
+
+	def size(self):
+		return abs(self.b - self.a)
+
+
+class Settings(object):
+	def __init__(self, values=None):
+		self.values = dict(values or {})
+
+	def get(self, key, default=None):
+		return self.values.get(key, default)
+
+	def set(self, key, value):
+		self.values[key] = value
+
+
+class View(object):
+	next_id = 1
+
+	def __init__(self, window, file_name, text, settings=None):
+		self.view_id = View.next_id
+		View.next_id += 1
+		self.win = window
+		self.path = file_name
+		self.text = text
+		self.changes = 1
+		self.view_settings = Settings(settings)
+
+	def id(self):
+		return self.view_id
+
+	def buffer_id(self):
+		return self.view_id
+
+	def file_name(self):
+		return self.path
+
+	def window(self):
+		return self.win
+
+	def settings(self):
+		return self.view_settings
+
+	def size(self):
+		return len(self.text)
+
+	def change_count(self):
+		return self.changes
+
+	def is_loading(self):
+		return False
+
+	def is_valid(self):
+		return True
+
+	def buffer(self):
+		return Buffer(self)
+
+	def substr(self, region):
+		if isinstance(region, int):
+			return self.text[region:region + 1]
+		return self.text[region.begin():region.end()]
+
+	def line(self, point):
+		if isinstance(point, Region):
+			point = point.begin()
+		start = self.text.rfind('\n', 0, point) + 1
+		end = self.text.find('\n', point)
+		return Region(start, len(self.text) if end == -1 else end)
+
+	def scope_name(self, point):
+		return 'source.odin '
+
+	def match_selector(self, point, selector):
+		return selector.startswith('source.odin')
+
+	def replace_text(self, text):
+		self.text = text
+		self.changes += 1
+
+	def show_popup(self, *args, **kwargs):
+		pass
+
+	def hide_popup(self):
+		pass
+
+	def run_command(self, cmd, args=None):
+		pass
+
+
+class Buffer(object):
+	def __init__(self, view):
+		self.view = view
+
+	def id(self):
+		return self.view.buffer_id()
+
+	def primary_view(self):
+		return self.view
+
+	def views(self):
+		return [self.view]
+
+
+class Window(object):
+	def __init__(self):
+		self.open_views = []
+		self.last_status = None
+
+	def new_view(self, file_name, text, settings=None):
+		view = View(self, file_name, text, settings)
+		self.open_views.insert(0, view)
+		return view
+
+	def views(self):
+		return list(self.open_views)
+
+	def active_view(self):
+		return self.open_views[0] if len(self.open_views) > 0 else None
+
+	def find_open_file(self, file_name):
+		for view in self.open_views:
+			if view.file_name() == file_name:
+				return view
+		return None
+
+	def status_message(self, message):
+		self.last_status = message
+
+	def run_command(self, cmd, args=None):
+		pass
+
+
+_active_window = Window()
+
+
+def active_window():
+	return _active_window
+
+
+def windows():
+	return [_active_window]
+
+
+def platform():
+	return {'darwin': 'osx', 'win32': 'windows'}.get(os.sys.platform, 'linux')
+
+
+def arch():
+	return 'x64'
+
+
+def cache_path():
+	return _cache_path
+
+
+def load_settings(name):
+	return Settings()
+
+
+def status_message(message):
+	_active_window.status_message(message)
+
+
+def set_timeout(callback, delay=0):
+	callback()
+
+
+def set_timeout_async(callback, delay=0):
+	callback()
@@ -0,0 +1,29 @@
+# minimal stand-in for sublime_plugin, see sublime.py
+
+
+class EventListener(object):
+	pass
+
+
+class ViewEventListener(object):
+	def __init__(self, view):
+		self.view = view
+
+
+class TextChangeListener(object):
+	def __init__(self, buffer=None):
+		self.buffer = buffer
+
+
+class ApplicationCommand(object):
+	pass
+
+
+class WindowCommand(object):
+	def __init__(self, window):
+		self.window = window
+
+
+class TextCommand(object):
+	def __init__(self, view):
+		self.view = view
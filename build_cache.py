@@ -0,0 +1,125 @@
+import os
+import shutil
+import hashlib
+from Odin import parser
+
+
+# remembers a hash of everything that goes into a build (the sources of the built package and of every package it
+# imports, the build flags, the compiler and the native libraries) by the executable it produced. When the hash of the
+# next build matches and the executable is still the one that build produced the compile can be skipped. Sources are
+# hashed by their parser.get_source_stamps.
+class BuildCache(object):
+	def __init__(self):
+		# executable path -> (inputs hash, time the build was started)
+		self.builds = dict()
+		# .odin file path -> ((mtime, size), [import paths]) so that only changed files are read again
+		self.imports_by_file = dict()
+		self.loaded = False
+
+	# hash of the inputs of building the package of file with flags. libraries is the native_index.NativeLibraryIndex.
+	def hash_inputs(self, file, odin_path, flags, libraries):
+		digest = hashlib.sha1()
+		digest.update('{}\n'.format(flags).encode('utf-8'))
+
+		compiler = shutil.which('odin')
+		digest.update('{}:{}\n'.format(compiler, get_file_stamp(compiler) if compiler != None else None).encode('utf-8'))
+
+		for directory, name in libraries.find(''):
+			path = os.path.join(directory, name)
+			digest.update('{}:{}\n'.format(path, get_file_stamp(path)).encode('utf-8'))
+
+		packages = [os.path.dirname(os.path.abspath(file))]
+		seen = set(packages)
+		while len(packages) > 0:
+			package = packages.pop()
+			for path in self.hash_package(digest, package, odin_path):
+				if path not in seen:
+					seen.add(path)
+					packages.append(path)
+		return digest.hexdigest()
+
+	# adds the .odin files of the package folder to digest and returns the paths it imports. Foreign imports of files are
+	# hashed right away.
+	def hash_package(self, digest, package, odin_path):
+		digest.update('package {}\n'.format(package).encode('utf-8'))
+		imports = []
+		for name, path, mtime, size in parser.get_source_stamps(package):
+			digest.update('{}:{}:{}\n'.format(name, mtime, size).encode('utf-8'))
+			imports.extend(self.get_imports(path, (mtime, size), odin_path))
+
+		packages = []
+		for path in imports:
+			if os.path.isdir(path):
+				packages.append(path)
+			elif os.path.isfile(path):
+				digest.update('foreign {}:{}\n'.format(path, get_file_stamp(path)).encode('utf-8'))
+		return packages
+
+	# the resolved paths of the imports in the header of the file at path
+	def get_imports(self, path, key, odin_path):
+		entry = self.imports_by_file.get(path)
+		if entry != None and entry[0] == key:
+			return entry[1]
+
+		try:
+			text = parser.read_file_text(path, key)
+		except (OSError, ValueError):
+			return []
+		end = parser.find_header_end(text)
+		imports = []
+		for collection, import_path in import_path_pattern.findall(text, 0, end if end != None else len(text)):
+			if collection == 'system':
+				continue
+			if collection != '':
+				imports.append(os.path.normpath(os.path.join(odin_path, collection, import_path)))
+			else:
+				imports.append(os.path.normpath(os.path.join(os.path.dirname(path), import_path)))
+		self.imports_by_file[path] = (key, imports)
+		return imports
+
+	# whether the executable at exe_path was produced by a build with inputs_hash
+	def is_up_to_date(self, exe_path, inputs_hash):
+		build = self.builds.get(exe_path)
+		if build == None or build[0] != inputs_hash:
+			return False
+		try:
+			# file times can lag the clock by a bit on coarse file systems
+			return os.stat(exe_path).st_mtime >= build[1] - 2
+		except OSError:
+			return False
+
+	def record(self, exe_path, inputs_hash, started_secs):
+		self.builds[exe_path] = (inputs_hash, started_secs)
+
+	def forget(self, exe_path):
+		self.builds.pop(exe_path, None)
+
+	def save(self, cache_path):
+		parser.save_pickle(cache_path, {'version': build_cache_version, 'builds': self.builds})
+
+	# loads the builds of the previous sessions once. A missing, corrupt or outdated file just means rebuilding.
+	def load(self, cache_path):
+		if self.loaded:
+			return
+		self.loaded = True
+		cache = parser.load_pickle(cache_path, build_cache_version)
+		if cache != None and isinstance(cache.get('builds'), dict):
+			for exe_path, build in cache['builds'].items():
+				if isinstance(build, tuple) and len(build) == 2 and isinstance(build[1], float):
+					self.builds[exe_path] = build
+
+
+# (mtime, size) of the file at path or None when it does not exist
+def get_file_stamp(path):
+	try:
+		stat = os.stat(path)
+		return (stat.st_mtime, stat.st_size)
+	except OSError:
+		return None
+
+
+build_cache_version = 1
+# captures: 1 -> collection (core, shared, system...) or '', 2 -> path. Also matches foreign imports.
+import_path_pattern = parser.LazyPattern(r'\bimport\s+(?:\w+\s*)?"(?:(\w+):)?([^"]*)"')
+
+build_cache = BuildCache()
@@ -0,0 +1,120 @@
+import os
+import pickle
+import threading
+import subprocess
+from Odin import parser
+from Odin import indexer
+
+
+# parses many files at once (a cold index of the core and shared collections) in helper processes. The plugin host only
+# has one interpreter, so each helper is a standalone Python running parser.py (see parser.index_worker). Every helper is
+# fed one package folder at a time and the symbols of a package are stored in parser.file_symbols_cache as soon as it is
+# done, so completions pick them up while the rest is still being parsed. Packages are handed out largest first to
+# whichever helper is free. Without a usable Python the files are parsed in process instead.
+class IndexPool(object):
+	def __init__(self, python='python3', processes=2):
+		self.python = python
+		self.processes = processes
+		self.worker = indexer.Indexer('OdinIndexPool')
+		self.lock = threading.Lock()
+		self.helpers = []
+		self.stopped = False
+
+	# queues the files in paths that are not indexed yet or changed (all of them with force) for parsing. on_done is called
+	# on the worker with the number of files that were parsed.
+	def submit(self, key, paths, on_done=None, force=False):
+		def job():
+			count = self.index_files(paths, force)
+			if on_done != None:
+				on_done(count)
+		self.worker.submit(key, job)
+
+	def stop(self):
+		self.worker.stop()
+		with self.lock:
+			self.stopped = True
+			for helper in self.helpers:
+				helper.kill()
+
+	# parses paths and returns how many files were parsed
+	def index_files(self, paths, force=False):
+		packages = dict()
+		for path in paths:
+			try:
+				if force or parser.file_symbols_cache.get_symbols(path, parser.get_file_key(path)) == None:
+					packages.setdefault(os.path.dirname(path), []).append(path)
+			except OSError:
+				parser.file_symbols_cache.invalidate(path)
+
+		queue = sorted(packages.values(), key=len)
+		count = sum(len(files) for files in queue)
+		helpers = []
+		for _ in range(min(self.processes, len(queue))):
+			try:
+				helpers.append(self.start_helper())
+			except OSError as e:
+				print('Odin: could not start the index helper {}: {}'.format(self.python, e))
+				break
+
+		if len(helpers) > 0:
+			with self.lock:
+				self.helpers = helpers
+			threads = [threading.Thread(target=self.feed_helper, args=(helper, queue), name='OdinIndexHelper') for helper in helpers]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			with self.lock:
+				self.helpers = []
+
+		# anything the helpers did not get to
+		while len(queue) > 0 and not self.stopped:
+			self.index_in_process(queue.pop())
+		return count
+
+	def index_in_process(self, files):
+		for path in files:
+			parser.file_symbols_cache.invalidate(path)
+			parser.index_file(path, parser.get_file_key, parser.read_file_text)
+
+	def start_helper(self):
+		startupinfo = None
+		if os.name == 'nt':
+			startupinfo = subprocess.STARTUPINFO()
+			startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+		return subprocess.Popen([self.python, '-E', os.path.abspath(parser.__file__)], stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=startupinfo)
+
+	# hands the packages of queue to helper one at a time until the queue is empty. Whatever a failed helper did not get to
+	# is parsed in process.
+	def feed_helper(self, helper, queue):
+		files = None
+		try:
+			while True:
+				with self.lock:
+					files = queue.pop() if len(queue) > 0 else None
+				if files == None:
+					break
+
+				pickle.dump(files, helper.stdin, parser.index_worker_protocol)
+				helper.stdin.flush()
+				for path, key, columns in pickle.load(helper.stdout):
+					if key == None:
+						parser.file_symbols_cache.invalidate(path)
+					else:
+						parser.file_symbols_cache.set_symbols(path, key, parser.symbols_from_columns(columns, path))
+				files = None
+		except (OSError, EOFError, pickle.UnpicklingError) as e:
+			if not self.stopped:
+				print('Odin: index helper failed: {}'.format(e))
+				self.index_in_process(files or [])
+		finally:
+			try:
+				helper.stdin.close()
+			except OSError:
+				pass
+			helper.wait()
+
+
+pool = IndexPool()
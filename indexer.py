@@ -0,0 +1,114 @@
+import threading
+import traceback
+import collections
+
+
+# background worker that runs the indexing jobs (parsing files, listing package folders) off of the completion path.
+# Jobs are keyed so that submitting the same work again while it is still pending is a no-op. Callbacks registered with
+# when_idle run on the worker once the queue drains.
+class Indexer(object):
+	def __init__(self, name='OdinIndexer'):
+		self.name = name
+		self.jobs = collections.OrderedDict()
+		self.idle_callbacks = []
+		self.condition = threading.Condition()
+		self.busy = False
+		self.stopped = False
+		self.thread = None
+
+	def submit(self, key, job):
+		with self.condition:
+			if self.stopped or key in self.jobs:
+				return
+			self.jobs[key] = job
+			self.start()
+			self.condition.notify_all()
+
+	# drops the job submitted with key unless it already started
+	def cancel(self, key):
+		with self.condition:
+			self.jobs.pop(key, None)
+			self.condition.notify_all()
+
+	def is_idle(self):
+		with self.condition:
+			return not self.busy and len(self.jobs) == 0
+
+	def when_idle(self, callback):
+		with self.condition:
+			if self.busy or len(self.jobs) > 0:
+				self.idle_callbacks.append(callback)
+				return
+		callback()
+
+	# blocks until all the queued jobs are done. Returns False if timeout (in seconds) expired first.
+	def wait_idle(self, timeout=None):
+		with self.condition:
+			return self.condition.wait_for(lambda: not self.busy and len(self.jobs) == 0, timeout)
+
+	def stop(self):
+		with self.condition:
+			self.stopped = True
+			self.jobs.clear()
+			self.idle_callbacks = []
+			self.condition.notify_all()
+
+	def start(self):
+		if self.thread == None or not self.thread.is_alive():
+			self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+			self.thread.start()
+
+	def run(self):
+		while True:
+			callbacks = []
+			job = None
+			with self.condition:
+				self.busy = False
+				if self.stopped:
+					return
+
+				if len(self.jobs) > 0:
+					_, job = self.jobs.popitem(last=False)
+					self.busy = True
+				elif len(self.idle_callbacks) > 0:
+					callbacks = self.idle_callbacks
+					self.idle_callbacks = []
+				else:
+					self.condition.notify_all()
+					self.condition.wait()
+					continue
+
+			for callback in callbacks:
+				try:
+					callback()
+				except Exception:
+					traceback.print_exc()
+
+			if job != None:
+				try:
+					job()
+				except Exception:
+					traceback.print_exc()
+
+
+background_indexer = Indexer()
+
+
+def submit(key, job):
+	background_indexer.submit(key, job)
+
+
+def when_idle(callback):
+	background_indexer.when_idle(callback)
+
+
+def wait_idle(timeout=None):
+	return background_indexer.wait_idle(timeout)
+
+
+def is_idle():
+	return background_indexer.is_idle()
+
+
+def stop():
+	background_indexer.stop()
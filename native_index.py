@@ -0,0 +1,72 @@
+import os
+from Odin import parser
+from Odin import package_index
+
+
+# the native libraries in the folders named 'native' of a folder tree (odin/shared) that OdinBuildCommand links against
+# and puts on the library path. Being a package_index.DirectoryTree a build costs one stat per directory instead of a
+# walk of the whole tree, and the snapshots are saved to disk so that the first build of a session does not list the
+# tree either. Like os.walk every directory but '.git' is descended into and symlinked directories are not followed.
+class NativeLibraryIndex(package_index.DirectoryTree):
+	def is_indexed_dir(self, entry):
+		return entry.name != '.git' and not entry.is_symlink()
+
+	def is_indexed_file(self, directory, entry):
+		return directory.endswith('native') and entry.name.endswith(native_library_extensions)
+
+	# snapshots of the tree top down in the order os.walk lists it, as of the last refresh
+	def walk(self):
+		stack = [self.root]
+		while len(stack) > 0:
+			directory = stack.pop()
+			snapshot = self.snapshots.get(directory)
+			if snapshot == None:
+				continue
+			yield directory, snapshot
+			stack.extend(os.path.join(directory, name) for name in reversed(snapshot.dirs))
+
+	# (directory, file name) of every library ending in lib_ext as of the last refresh
+	def find(self, lib_ext):
+		return [(directory, f) for directory, snapshot in self.walk() for f in snapshot.files if f.endswith(lib_ext)]
+
+	def save(self, index_path):
+		snapshots = dict((directory, (s.mtime, s.dirs, s.files)) for directory, s in self.snapshots.items())
+		parser.save_pickle(index_path, {'version': native_index_version, 'root': self.root, 'snapshots': snapshots})
+		self.dirty = False
+
+	# loads the snapshots saved for the same root, anything else (a missing, corrupt or outdated file) is ignored
+	def load(self, index_path):
+		index = parser.load_pickle(index_path, native_index_version)
+		if index == None or index.get('root') != self.root:
+			return
+
+		try:
+			for directory, (mtime, dirs, files) in index['snapshots'].items():
+				self.snapshots[directory] = package_index.DirectorySnapshot(mtime, dirs, files)
+		except (KeyError, TypeError, ValueError, AttributeError):
+			self.snapshots.clear()
+
+
+native_index_version = 1
+native_library_extensions = ('.dylib', '.so', '.dll', '.lib')
+
+# the native library index of each shared folder a build used this session
+indexes = dict()
+
+
+# the refreshed index of root, loaded from index_path the first time it is used in a session and saved back to it when
+# anything changed
+def get_index(root, index_path):
+	root = os.path.normpath(root)
+	index = indexes.get(root)
+	if index == None:
+		index = indexes[root] = NativeLibraryIndex(root)
+		index.load(index_path)
+
+	index.refresh()
+	if index.dirty:
+		try:
+			index.save(index_path)
+		except OSError as e:
+			print('Odin: could not save the native library index: {}'.format(e))
+	return index
@@ -1,8 +1,11 @@
-import re
 import os
-import time
+import sys
 import json
+import hashlib
+import threading
 import subprocess
+from Odin import parser
+from Odin import indexer
 
 
 # JSON consists of two roots: packages and definitions. Some keys are optional, denoted with '?'.
@@ -26,109 +29,146 @@ import subprocess
 #		- exposed globals in the module
 #	- dotted non-module:
 #		- most likely a local variable. Too hard to figure out its type so forget it.
+#
+# `odin query` is run for the folder of the current package on a worker of its own so the compiler latency is never paid
+# on the typing path. The results (completions for the current package and every package it imports) are cached per
+# folder along with a hash of the folder's sources, and the compiler only runs again once that hash changes. A query that
+# takes longer than timeout_secs is killed and counts as failed until the sources change.
 class Completer(object):
-	full_reindex_interval_secs = 60
-	last_full_reindex_secs = -full_reindex_interval_secs # Ensure re-indexing happens on launch
-	last_indexed_file = ''
-
-	packages = []
-	procs_by_package = dict()
-	types_by_package = dict()
-	vars_by_package = dict() # includes the kinds 'constant' and 'variable'
-
-	proc_params_pattern = re.compile(r'.*?proc.*?(\(.*?)$')
-
-	# we re-index if this is a different file than was last indexed or it has been longer than
-	# full_reindex_interval_secs
-	def needs_reindex(self, current_file):
-		if self.last_indexed_file != current_file:
-			self.last_indexed_file = current_file
-			return True
-
-		if time.time() - self.last_full_reindex_secs > self.full_reindex_interval_secs:
-			return True
-		return False
-
-	def index_file(self, current_file):
-		if not self.needs_reindex(current_file):
+	def __init__(self, executable='odin', timeout_secs=10):
+		self.executable = executable
+		self.timeout_secs = timeout_secs
+		self.worker = indexer.Indexer('OdinQuery')
+		self.lock = threading.Lock()
+		# folder -> (sources hash, dictionary of package name -> CompletionIndex or None if the query failed)
+		self.results_by_folder = dict()
+		self.callbacks_by_folder = dict()
+		self.process = None
+		self.running_folder = None
+		self.cancelled = False
+
+	# returns the last results for folder (package name -> CompletionIndex) or None if there are none yet. The folder is
+	# queued for a query that only runs if its sources changed, on_done is called on the worker when new results are in.
+	def get_completions(self, folder, on_done=None):
+		with self.lock:
+			entry = self.results_by_folder.get(folder)
+			self.callbacks_by_folder[folder] = on_done
+		self.worker.submit(('query', folder), lambda: self.query_job(folder))
+		return entry[1] if entry != None else None
+
+	# drops a queued query of folder (or of any folder) and kills the running one
+	def cancel(self, folder=None):
+		if folder != None:
+			self.worker.cancel(('query', folder))
+		with self.lock:
+			if self.process != None and (folder == None or folder == self.running_folder):
+				self.cancelled = True
+				self.process.kill()
+
+	def stop(self):
+		self.worker.stop()
+		self.cancel()
+
+	def query_job(self, folder):
+		sources_hash = hash_sources(folder)
+		with self.lock:
+			entry = self.results_by_folder.get(folder)
+		if entry != None and entry[0] == sources_hash:
 			return
 
-		contents = open(current_file, 'r', encoding='utf-8').read()
-		if contents.find('main :: proc') == -1:
+		try:
+			completions = self.run_query(folder)
+		except QueryCancelled:
 			return
+		except (OSError, ValueError, KeyError, subprocess.SubprocessError) as e:
+			print('Odin: odin query failed for {}: {}'.format(folder, e))
+			completions = None
+
+		with self.lock:
+			self.results_by_folder[folder] = (sources_hash, completions)
+			on_done = self.callbacks_by_folder.pop(folder, None)
+		if completions != None and on_done != None:
+			on_done()
+
+	def run_query(self, folder):
+		startupinfo = None
+		if os.name == 'nt':
+			startupinfo = subprocess.STARTUPINFO()
+			startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+		with self.lock:
+			self.cancelled = False
+			self.running_folder = folder
+			self.process = subprocess.Popen([self.executable, 'query', folder, '-global-definitions'], cwd=folder,
+				stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo)
+
+		try:
+			output, errors = self.process.communicate(timeout=self.timeout_secs)
+		except subprocess.TimeoutExpired:
+			self.process.kill()
+			self.process.communicate()
+			raise
+		finally:
+			with self.lock:
+				process = self.process
+				cancelled = self.cancelled
+				self.process = None
+				self.running_folder = None
+
+		if cancelled:
+			raise QueryCancelled()
+		if process.returncode != 0:
+			raise subprocess.CalledProcessError(process.returncode, process.args, output, errors)
+		return self.make_completions(json.loads(output.decode('utf-8')))
+
+	# dictionary of package name -> CompletionIndex of the Symbols of the definitions in the json output of `odin query`
+	def make_completions(self, js):
+		symbols_by_package = dict((p['name'], []) for p in js['packages'])
+		for d in js['definitions']:
+			location = (d.get('filepath'), d.get('file_offset'), d.get('line', 1) - 1, d.get('column', 1) - 1)
+			package = sys.intern(d['package'])
+			name = sys.intern(d['name'])
+			kind = d['kind']
+			typ = d.get('type')
 
-		output = subprocess.check_output(['odin', 'query', current_file, '-global-definitions'])
+			if kind == 'type name':
+				symbol = parser.Symbol(name, 'type', package, d.get('type_kind', 'type'), *location)
+			elif kind == 'constant':
+				symbol = parser.Symbol(name, 'const', package, None, *location)
+			elif kind == 'variable':
+				symbol = parser.Symbol(name, 'var', package, typ, *location)
+			elif kind == 'procedure' and typ != None:
+				symbol = parser.Symbol(name, 'proc', package, self.parse_proc_signature(typ), *location)
+			elif kind == 'procedure group':
+				symbol = parser.Symbol(name, 'overload', package, (), *location)
+			else:
+				continue
+			symbols_by_package.setdefault(package, []).append(symbol)
 
-		js = json.loads(output.decode('utf-8'))
-		packages = js['packages']
-		definitions = js['definitions']
+		return dict((package, parser.CompletionIndex(symbols)) for package, symbols in symbols_by_package.items())
 
-		for p in packages:
-			if p['name'] == 'main':
-				continue
-			self.packages.append(p['name'])
-
-		type_kind = []
-		kinds = []
-		types = []
-		for d in definitions:
-			package = d['package']
-			name = d['name']
-			kind = d['kind']
-			typ = d.get('type')
+	# (params, return type) of the type of a proc, ie 'proc(a: int, b: f32) -> int'
+	def parse_proc_signature(self, sig):
+		start = sig.find('(')
+		if start == -1:
+			return ((), None)
 
-			type_kind.append(d.get('type_kind'))
-			kinds.append(kind)
-			types.append(typ)
+		end = parser.skip_balanced(sig, start)
+		return_type = sig[end:].strip()
+		return_type = return_type[2:].strip() if return_type.startswith('->') else None
+		return (tuple(parser.split_params(sig, start + 1, end - 1)), return_type)
 
-			if kind == 'type name':
-				self.types_for_package(package).append([typ + '\t' + package, typ])
-			elif kind == 'variable' or kind == 'constant':
-				self.vars_for_package(package).append([name + '\t' + d.get('type_kind', package), name])
-			elif kind == 'procedure':
-				self.procs_for_package(package).append(self.gen_completion_for_proc(package, name, typ))
-		self.last_full_reindex_secs = time.time()
-
-	def gen_completion_for_proc(self, package, name, sig):
-		parts = list(map(lambda s:s.strip(), sig.split('->')))
-		body = self.proc_params_pattern.findall(parts[0])[0]
-		params = list(map(lambda s:s.strip(' ()'), body.split(',')))
-
-		trigger = name + sig[sig.index('('):]
-		result = name + '('
-
-		if len(params) > 0:
-			for p in range(len(params)):
-				if p > 0:
-					result += ', '
-				result += '${' + str(p + 1) + ':' + params[p] + '}'
-		result += ')'
-
-		return [trigger + '\t' + package, result]
-
-	def procs_for_package(self, package):
-		if not package in self.procs_by_package:
-			self.procs_by_package[package] = []
-		else:
-			self.procs_by_package[package].clear()
-		return self.procs_by_package[package]
-
-	def types_for_package(self, package):
-		if not package in self.types_by_package:
-			self.types_by_package[package] = []
-		else:
-			self.types_by_package[package].clear()
-		return self.types_by_package[package]
-
-	def vars_for_package(self, package):
-		if not package in self.vars_by_package:
-			self.vars_by_package[package] = []
-		else:
-			self.vars_by_package[package].clear()
-		return self.vars_by_package[package]
-
-
-
-
-#c = Completer()
-#c.index_file('/Users/mikedesaro/odin/shared/engine/input/input.odin')
\ No newline at end of file
+
+class QueryCancelled(Exception):
+	pass
+
+
+# hash of the names, mtimes and sizes of the .odin files in folder
+def hash_sources(folder):
+	digest = hashlib.sha1()
+	for name, _, mtime, size in parser.get_source_stamps(folder):
+		digest.update('{}:{}:{}\n'.format(name, mtime, size).encode('utf-8'))
+	return digest.hexdigest()
+
+
+completer = Completer()
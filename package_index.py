@@ -0,0 +1,276 @@
+import os
+import re
+import platform
+from Odin import parser
+
+
+# snapshot of a single directory: its mtime, the names of its sub directories and the indexed files in it
+class DirectorySnapshot(object):
+	__slots__ = ['mtime', 'dirs', 'files']
+
+	def __init__(self, mtime, dirs, files):
+		self.mtime = mtime
+		self.dirs = dirs
+		self.files = files
+
+
+# snapshots of every directory of a folder tree. The tree is listed once with os.scandir and afterwards a directory is
+# only listed again when its mtime changes. Subclasses pick the directories to descend into and the files to keep.
+class DirectoryTree(object):
+	def __init__(self, root):
+		self.root = os.path.normpath(root)
+		self.snapshots = dict()
+		# bumped whenever an indexed directory or file is added or removed anywhere in the tree
+		self.version = 0
+		# set whenever a directory is listed or removed, ie to know when the snapshots need saving
+		self.dirty = False
+
+	def is_indexed_dir(self, entry):
+		return not entry.name.startswith('.')
+
+	def is_indexed_file(self, directory, entry):
+		return True
+
+	# called with every directory that was listed again
+	def snapshot_updated(self, directory, snapshot):
+		pass
+
+	# validates the whole tree (or the subtree at folder) with one stat per directory, re-listing the changed ones
+	def refresh(self, folder=None):
+		folder = os.path.normpath(folder or self.root)
+		stale = set(d for d in self.snapshots if d == folder or d.startswith(folder + os.sep))
+		stack = [folder]
+		while len(stack) > 0:
+			directory = stack.pop()
+			stale.discard(directory)
+			snapshot = self.get_snapshot(directory)
+			if snapshot != None:
+				stack.extend(os.path.join(directory, name) for name in snapshot.dirs)
+
+		for directory in stale:
+			self.remove_snapshot(directory)
+
+	# returns the up to date snapshot of directory, listing it only if it is new or its mtime changed
+	def get_snapshot(self, directory):
+		snapshot = self.snapshots.get(directory)
+		try:
+			mtime = os.stat(directory).st_mtime
+		except OSError:
+			if snapshot != None:
+				self.remove_snapshot(directory)
+			return None
+
+		if snapshot != None and snapshot.mtime == mtime:
+			return snapshot
+
+		dirs = []
+		files = []
+		try:
+			with os.scandir(directory) as entries:
+				for entry in entries:
+					if entry.is_dir():
+						if self.is_indexed_dir(entry):
+							dirs.append(entry.name)
+					elif self.is_indexed_file(directory, entry):
+						files.append(entry.name)
+		except OSError:
+			return None
+
+		if snapshot == None or sorted(snapshot.dirs) != sorted(dirs) or sorted(snapshot.files) != sorted(files):
+			self.version += 1
+		snapshot = DirectorySnapshot(mtime, dirs, files)
+		self.snapshots[directory] = snapshot
+		self.dirty = True
+		self.snapshot_updated(directory, snapshot)
+		return snapshot
+
+	def remove_snapshot(self, directory):
+		if self.snapshots.pop(directory, None) != None:
+			self.version += 1
+			self.dirty = True
+
+
+# index of a folder tree (odin/core, odin/shared or a project folder) that maps every directory to its .odin files and
+# every package name (the directory basename) to the directories with that name. Files that do not build for the target
+# platform (see matches_target) are left out of the listing.
+class PackageIndex(DirectoryTree):
+	def __init__(self, root):
+		DirectoryTree.__init__(self, root)
+		self.dirs_by_package = dict()
+
+	def is_indexed_file(self, directory, entry):
+		return not entry.name.startswith('.') and entry.name.endswith('.odin') and entry.is_file() and matches_target(entry.path, entry.name)
+
+	def snapshot_updated(self, directory, snapshot):
+		package_dirs = self.dirs_by_package.setdefault(os.path.basename(directory), set())
+		if len(snapshot.files) > 0:
+			package_dirs.add(directory)
+		else:
+			package_dirs.discard(directory)
+
+	def remove_snapshot(self, directory):
+		DirectoryTree.remove_snapshot(self, directory)
+		self.dirs_by_package.get(os.path.basename(directory), set()).discard(directory)
+
+	def is_ready(self):
+		return len(self.snapshots) > 0
+
+	# list of the full paths of the .odin files in directory. With validate=False no disk access happens and the last
+	# known state is returned.
+	def files_in(self, directory, validate=True):
+		directory = os.path.normpath(directory)
+		snapshot = self.get_snapshot(directory) if validate else self.snapshots.get(directory)
+		if snapshot == None:
+			return []
+		return [os.path.join(directory, f) for f in snapshot.files]
+
+	# list of the full paths of every .odin file in the tree as it was last listed
+	def all_files(self):
+		return [os.path.join(directory, f) for directory, snapshot in list(self.snapshots.items()) for f in snapshot.files]
+
+	# dictionary of directory -> .odin file paths for every directory in the tree named package
+	def files_for_package(self, package, validate=True):
+		if validate and not self.is_ready():
+			self.refresh()
+
+		files_by_dir = dict()
+		for directory in list(self.dirs_by_package.get(package, ())):
+			files = self.files_in(directory, validate)
+			if len(files) > 0:
+				files_by_dir[directory] = files
+		return files_by_dir
+
+
+# one index per root folder, kept alive for the whole session
+indexes = dict()
+
+
+odin_os_names = set(['windows', 'darwin', 'linux', 'essence', 'freebsd', 'openbsd', 'netbsd', 'haiku', 'wasi', 'js', 'orca', 'freestanding'])
+odin_arch_names = set(['amd64', 'i386', 'arm32', 'arm64', 'wasm32', 'wasm64p32', 'riscv64'])
+arch_by_machine = {'x86_64': 'amd64', 'amd64': 'amd64', 'x64': 'amd64', 'i386': 'i386', 'i686': 'i386', 'x86': 'i386', 'arm64': 'arm64',
+	'aarch64': 'arm64', 'armv7l': 'arm32', 'riscv64': 'riscv64'}
+# captures: 1 -> the tags of a '#+build' or '//+build' line
+build_tag_pattern = parser.LazyPattern(r'^[ \t]*(?:#|//)\+build[ \t]+([^\n]*)', re.M)
+package_line_pattern = parser.LazyPattern(r'^[ \t]*package\b', re.M)
+# build tags come before the package line, which is near the top of the file
+max_build_header_bytes = 4096
+
+
+# (os, arch) of the machine Sublime runs on, in Odin's names
+def get_host_target():
+	return (platform.system().lower(), arch_by_machine.get(platform.machine().lower(), 'amd64'))
+
+
+# the (os, arch) the package listings are filtered for
+target = get_host_target()
+
+
+# sets the target to an Odin target name ('linux_amd64', 'windows_i386'), or to the host for None. A different target
+# makes every index list its directories again.
+def set_target(name):
+	global target
+	new_target = get_host_target()
+	if name:
+		os_name, _, arch = name.partition('_')
+		new_target = (os_name, arch or new_target[1])
+	if new_target == target:
+		return
+
+	target = new_target
+	for index in list(indexes.values()):
+		for snapshot in list(index.snapshots.values()):
+			snapshot.mtime = None
+
+
+# whether the file builds for the target. Like the compiler, a file named name_<os>.odin, name_<arch>.odin or
+# name_<os>_<arch>.odin only builds for that os and arch and the '#+build' lines of its header have to match.
+def matches_target(path, name):
+	parts = name[:-len('.odin')].split('_')
+	if len(parts) > 1 and parts[-1] in odin_arch_names:
+		if parts[-1] != target[1]:
+			return False
+		parts.pop()
+	if len(parts) > 1 and parts[-1] in odin_os_names and parts[-1] != target[0]:
+		return False
+
+	try:
+		header = parser.file_contents_cache.get_cached(path, parser.get_file_key(path))
+		if header == None:
+			with open(path, 'rb') as f:
+				header = f.read(max_build_header_bytes).decode('utf-8', 'ignore')
+	except OSError:
+		return True
+	m = package_line_pattern.search(header)
+	return all(matches_build_tags(tags) for tags in build_tag_pattern.findall(header, 0, m.start() if m != None else len(header)))
+
+
+# whether the tags of a build line match the target. Alternatives are separated by ',' and the terms of an alternative
+# by spaces, ie 'linux amd64, darwin'. Negated alternatives all have to hold ('!windows, !js' excludes both).
+def matches_build_tags(tags):
+	names = set(target + ('{}_{}'.format(*target),))
+	positives = []
+	for alternative in tags.split(','):
+		terms = alternative.split()
+		if len(terms) == 0:
+			continue
+		matches = all((term[1:] not in names) if term.startswith('!') else (term in names) for term in terms)
+		if all(term.startswith('!') for term in terms):
+			if not matches:
+				return False
+		else:
+			positives.append(matches)
+	return len(positives) == 0 or any(positives)
+
+
+# makes the next refresh list directory again, ie after a file in it was saved with different build tags
+def invalidate_directory(directory):
+	directory = os.path.normpath(directory)
+	for index in list(indexes.values()):
+		snapshot = index.snapshots.get(directory)
+		if snapshot != None:
+			snapshot.mtime = None
+
+
+def get_index(root):
+	root = os.path.normpath(root)
+	index = indexes.get(root)
+	if index == None:
+		index = indexes[root] = PackageIndex(root)
+	return index
+
+
+def refresh_all():
+	for index in list(indexes.values()):
+		index.refresh()
+
+
+# dictionary keyed by the package name to the import path of the core and shared packages. 'sdl' -> 'shared:engine/libs/sdl'
+# It is updated in place and never cleared, so it can be read while it is being updated.
+package_to_path = dict()
+# the versions of the core and shared indexes package_to_path was built from
+package_paths_versions = [None]
+
+
+# refreshes the core and shared indexes of the install at odin_path (one stat per directory, only changed directories
+# are listed again) and updates package_to_path when anything was added or removed. Shared packages win over core
+# packages with the same name.
+def update_package_paths(odin_path):
+	roots = [(collection, get_index(os.path.join(odin_path, collection))) for collection in ['core', 'shared']]
+	for _, index in roots:
+		index.refresh()
+
+	versions = tuple((index.root, index.version) for _, index in roots)
+	if versions == package_paths_versions[0]:
+		return
+	package_paths_versions[0] = versions
+
+	paths = dict()
+	for collection, index in roots:
+		for package, dirs in list(index.dirs_by_package.items()):
+			dirs = [d for d in dirs if d != index.root]
+			if len(dirs) > 0:
+				paths[package] = collection + ':' + os.path.relpath(min(dirs), index.root).replace(os.sep, '/')
+
+	for package in [p for p in package_to_path if p not in paths]:
+		package_to_path.pop(package, None)
+	package_to_path.update(paths)
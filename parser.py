@@ -1,141 +1,1125 @@
 import re
 import os
-import fnmatch
+import sys
+import mmap
+import bisect
+import pickle
+import operator
+import itertools
+import threading
+import collections
 
-# stores the completions list by package name
+# stores the completions list by package name. The least recently used packages are evicted once either the entry
+# budget or the (approximate) memory budget is exceeded. Packages are filled in by the indexer and looked up by the
+# completion queries so every access goes through the lock.
 class CompletionCache(object):
-	completions_by_package = dict()
+	def __init__(self, max_entries=64, max_bytes=32 * 1024 * 1024):
+		self.lock = threading.RLock()
+		self.completions_by_package = collections.OrderedDict()
+		self.size_by_package = dict()
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.total_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def configure(self, max_entries, max_bytes):
+		with self.lock:
+			self.max_entries = max_entries
+			self.max_bytes = max_bytes
+			self.evict()
 
 	def invalidate_completions(self, package):
-		self.completions_by_package.pop(package, None)
+		with self.lock:
+			if package in self.completions_by_package:
+				del self.completions_by_package[package]
+				self.total_bytes -= self.size_by_package.pop(package)
 
 	def has_completions(self, package):
 		return package in self.completions_by_package
 
-	def set_completions(self, package, completions):
-		self.completions_by_package[package] = completions
+	# whether package has completions and none of the files they were built from was re-indexed since. Stale ones are
+	# dropped.
+	def is_current(self, package):
+		with self.lock:
+			entry = self.completions_by_package.get(package)
+			if entry != None and any(file_symbols_cache.get_latest_symbols(path) is not symbols for path, symbols in entry[1]):
+				self.invalidate_completions(package)
+				entry = None
+			return entry != None
 
-# dictionary keyed by the package name to the full path. 'sdl' -> 'shared:engine/libs/sdl'
-package_to_path = dict()
-completions_cache = CompletionCache()
+	# returns the cached completions unless one of the files they were built from was re-indexed since
+	def get_completions(self, package):
+		with self.lock:
+			if not self.is_current(package):
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self.completions_by_package.move_to_end(package)
+			return self.completions_by_package[package][0]
+
+	# sources is a list of (path, FileSymbols) the completions were built from
+	def set_completions(self, package, completions, sources=()):
+		size = estimate_completions_size(completions)
+		with self.lock:
+			self.invalidate_completions(package)
+			self.completions_by_package[package] = (completions, sources)
+			self.size_by_package[package] = size
+			self.total_bytes += size
+			self.evict()
+
+	def evict(self):
+		while len(self.completions_by_package) > self.max_entries or (self.total_bytes > self.max_bytes and len(self.completions_by_package) > 1):
+			package, _ = self.completions_by_package.popitem(last=False)
+			self.total_bytes -= self.size_by_package.pop(package)
+			self.evictions += 1
+
+	def stats(self):
+		return {
+			'packages': len(self.completions_by_package),
+			'bytes': self.total_bytes,
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions
+		}
+
+
+# rough memory footprint of a CompletionIndex: the lists and object headers plus the characters of the strings it owns.
+# The names and signatures of symbols are shared with the symbol cache so only the records themselves are counted.
+def estimate_completions_size(index):
+	size = sys.getsizeof(index.completions) + sys.getsizeof(index.keys)
+	for c, key in zip(index.completions, index.keys):
+		if type(c) is Symbol:
+			size += 64 + 49 + len(key)
+		else:
+			size += 72 + 3 * 49 + len(c[0]) + len(c[1]) + len(key)
+	return size
+
+
+# completions sorted by the lowercase name they insert so that the ones starting with a typed prefix are found with a
+# binary search instead of handing every completion to Sublime for filtering. Completions are [trigger, result] pairs or
+# Symbols, which are only rendered once they are returned by merge_completions.
+class CompletionIndex(object):
+	__slots__ = ['keys', 'completions']
+
+	def __init__(self, completions):
+		entries = sorted(((completion_key(c), c) for c in completions), key=lambda e: e[0])
+		self.keys = [e[0] for e in entries]
+		self.completions = [e[1] for e in entries]
+
+	def __len__(self):
+		return len(self.completions)
+
+	# (start, end) range of the completions whose name starts with prefix (case insensitive)
+	def matching_range(self, prefix):
+		if len(prefix) == 0:
+			return 0, len(self.keys)
+		prefix = prefix.lower()
+		start = bisect.bisect_left(self.keys, prefix)
+		return start, bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+
+	def matching(self, prefix):
+		start, end = self.matching_range(prefix)
+		return self.completions[start:end]
+
+
+# returns (completions, truncated) with the completions of all the indexes that start with prefix, up to limit of them (0
+# for no limit). When sorting, no completion past position limit of its own presorted index can make the cut, so each
+# index contributes at most limit + 1 entries and the sorted runs are merged (timsort merges presorted runs in linear
+# passes). The cost is bounded by the limit and the number of indexes, not by the total number of symbols. Symbols are
+# rendered with label, or the name of their file when label is None.
+def merge_completions(indexes, prefix, limit=0, sort=True, label=None):
+	if not sort:
+		completions = [c for index in indexes for c in index.matching(prefix)]
+	else:
+		entries = []
+		for index in indexes:
+			start, end = index.matching_range(prefix)
+			if limit > 0:
+				end = min(end, start + limit + 1)
+			entries.extend(zip(index.keys[start:end], index.completions[start:end]))
+		entries.sort(key=operator.itemgetter(0))
+		completions = [entry[1] for entry in (entries if limit <= 0 else entries[:limit + 1])]
+
+	truncated = limit > 0 and len(completions) > limit
+	if truncated:
+		completions = completions[:limit]
+	return render_completions(completions, label), truncated
+
+
+# completions of the symbols returned lately, by label and symbol. Typing through a prefix returns the same symbols over
+# and over so they are rendered once, the cache is simply dropped when it grows past max_rendered_completions.
+rendered_completions = dict()
+max_rendered_completions = 4096
+
+
+def render_completions(completions, label):
+	rendered = rendered_completions.get(label)
+	if rendered == None or len(rendered) > max_rendered_completions:
+		if len(rendered_completions) > 64:
+			rendered_completions.clear()
+		rendered = rendered_completions[label] = dict()
+
+	result = []
+	for c in completions:
+		if type(c) is Symbol:
+			completion = rendered.get(c)
+			if completion == None:
+				completion = rendered[c] = c.completion(label)
+			c = completion
+		result.append(c)
+	return result
+
+
+# the lowercase name inserted by a completion, ie 'println' for ['println(args: ..any)\t fmt', 'println(${1:args: ..any})']
+def completion_name(completion):
+	m = completion_name_pattern.match(completion[1])
+	return m.group(0).lower() if m != None else completion[1].lower()
+
+
+def completion_key(completion):
+	if type(completion) is Symbol:
+		return sys.intern(completion.name.lower())
+	return completion_name(completion)
+
+
+# fuzzy name search over the symbols of a whole workspace. Names are lowered, deduplicated and numbered shortest first so
+# that going through the ids of the candidates in order visits the best ranked names first, and a search stops as soon as
+# it has limit symbols. Names are indexed by their trigrams and the first two characters of their words (lists of name
+# ids) and by their characters (bitsets of name ids in an int, intersected with '&'). Characters are indexed by how often
+# they appear as well ('tt' are the names with at least two 't's), up to max_search_char_count. Matches are ranked in
+# tiers: prefix, substring at a word start ('text' in 'draw_text'), any substring and then any subsequence ('dtx' in
+# 'draw_text'). Queries shorter than min_fuzzy_query_length only go through the first two tiers since nearly every name
+# contains one or two given characters, and the subsequence tier only checks the first max_subsequence_candidates names
+# that have the characters of the query so that a query matching next to nothing does not go through all of them.
+# Within a tier the symbols of the given packages come first, then shorter names.
+#
+# update swaps the symbols of re-indexed files in place. The names it adds are not in the trigram, word and character
+# indexes, they are checked one by one and merged into the ranking until get_symbol_search_index builds a new index.
+class SymbolSearchIndex(object):
+	def __init__(self, symbols):
+		symbols_by_name = dict()
+		for s in symbols:
+			symbols_by_name.setdefault(sys.intern(s.name.lower()), []).append(s)
+		self.names = sorted(symbols_by_name, key=lambda name: (len(name), name))
+		self.ids = dict((name, i) for i, name in enumerate(self.names))
+		self.symbols = [symbols_by_name[name] for name in self.names]
+		self.sorted_names = sorted(self.names)
+		self.sorted_ids = [self.ids[name] for name in self.sorted_names]
+		self.indexed_count = len(self.names)
+
+		trigrams = collections.defaultdict(list)
+		char_ids = collections.defaultdict(list)
+		word_ids = collections.defaultdict(list)
+		for i, name in enumerate(self.names):
+			for gram in set([name[j:j + 3] for j in range(len(name) - 2)]):
+				trigrams[gram].append(i)
+			for char in set(name):
+				char_ids[char].append(i)
+				count = name.count(char)
+				if count > 1:
+					for n in range(2, min(count, max_search_char_count) + 1):
+						char_ids[char * n].append(i)
+			for start in set([name[j:j + n] for j in range(1, len(name)) if name[j - 1] == '_' for n in (1, 2)]):
+				word_ids[start].append(i)
+		self.trigrams = dict(trigrams)
+		self.chars = dict((char, make_bitset(ids, len(self.names))) for char, ids in char_ids.items())
+		self.word_starts = dict(word_ids)
+
+		self.ids_by_package = dict()
+		for i, symbols in enumerate(self.symbols):
+			for s in symbols:
+				self.ids_by_package.setdefault(s.package, set()).add(i)
+		# (packages, ids, bitset of ids) of the last packages ranked first
+		self.boosted = (None, None, 0)
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.names)
+
+	# the number of names added by update since the index was built
+	def added_count(self):
+		return len(self.names) - self.indexed_count
+
+	# up to limit Symbols matching query, best first. packages is a collection of package names to rank first.
+	def search(self, query, limit=50, packages=()):
+		query = query.lower()
+		if len(query) == 0:
+			return []
+
+		with self.lock:
+			packages = frozenset(packages)
+			if self.boosted[0] != packages:
+				ids = set().union(*(self.ids_by_package.get(p, ()) for p in packages))
+				self.boosted = (packages, ids, make_bitset(ids, len(self.names)))
+
+			word_start = '_' + query
+			tiers = [
+				(self.prefix_matches, lambda name: name.startswith(query), None),
+				(self.word_start_matches, lambda name: word_start in name and not name.startswith(query), None)
+			]
+			if len(query) >= min_fuzzy_query_length:
+				# 'abc' -> 'a[^b]*b[^c]*c', which never backtracks
+				pattern = re.compile(re.escape(query[0]) + ''.join('[^{0}]*{0}'.format(re.escape(c)) for c in query[1:]))
+				tiers.append((self.substring_matches, lambda name: query in name and not name.startswith(query) and word_start not in name, None))
+				tiers.append((self.subsequence_matches, lambda name: query not in name and pattern.search(name) != None, max_subsequence_candidates))
+
+			results = []
+			for candidates, matches, max_candidates in tiers:
+				for i in self.rank(candidates(query), matches, limit - len(results), max_candidates):
+					results.extend(sorted(self.symbols[i], key=lambda s: s.package not in packages))
+					if len(results) >= limit:
+						return results[:limit]
+			return results
+
+	# up to count ids of the names in candidates that match, best first. candidates are the (boosted, other) ids in
+	# ascending order so the first count matches are the best ones, only max_candidates of them are checked unless it is
+	# None. The names added by update are checked one by one.
+	def rank(self, candidates, matches, count, max_candidates=None):
+		names = self.names
+		symbols = self.symbols
+		ids = []
+		for i in itertools.islice(itertools.chain(*candidates), max_candidates):
+			if len(symbols[i]) > 0 and matches(names[i]):
+				ids.append(i)
+				if len(ids) == count:
+					break
+
+		if len(names) > self.indexed_count:
+			boosted = self.boosted[1]
+			added = [i for i in range(self.indexed_count, len(names)) if len(symbols[i]) > 0 and matches(names[i])]
+			ids = sorted(ids + added, key=lambda i: (i not in boosted, len(names[i]), names[i]))[:count]
+		return ids
+
+	# names starting with query, the exact name first since it is the shortest
+	def prefix_matches(self, query):
+		start = bisect.bisect_left(self.sorted_names, query)
+		end = bisect.bisect_left(self.sorted_names, query + '\U0010ffff', start)
+		return self.split_boosted(sorted(self.sorted_ids[start:end]))
+
+	# names with a word starting with the first two characters of query
+	def word_start_matches(self, query):
+		return self.split_boosted(self.word_starts.get(query[:2], ()))
+
+	# names containing query, checked on the shortest trigram postings of the query
+	def substring_matches(self, query):
+		return self.split_boosted(min((self.trigrams.get(query[j:j + 3], ()) for j in range(len(query) - 2)), key=len))
+
+	def subsequence_matches(self, query):
+		return self.split_boosted_bits(self.names_with_chars(query))
+
+	# (boosted ids, other ids) of the ascending ids
+	def split_boosted(self, ids):
+		boosted = self.boosted[1]
+		return [i for i in ids if i in boosted], (i for i in ids if i not in boosted)
+
+	def split_boosted_bits(self, bits):
+		boosted = self.boosted[2]
+		return iterate_bits(bits & boosted), iterate_bits(bits & ~boosted)
 
+	# bitset of the names that contain every character of query (as often as query does)
+	def names_with_chars(self, query):
+		bits = -1
+		for char, count in collections.Counter(query).items():
+			bits &= self.chars.get(char * min(count, max_search_char_count), 0)
+		return bits
 
-# captures: 1 -> name, 2 -> params, 3 -> return types
-proc_return_pattern = re.compile(r'\b(\b[^_][\w_]+[\w\d_]*\b)\s*[:]\s*[:]\s*(?:inline|no_inline|)\s*proc\s*(?:|\s[\"a-z]+\s)\(([\w\W]*?)\)\s*(?:(?:->|where.*?)\s*(.*?))?(?:{|-|;)')
-# captures: 1 -> name, 2 -> overloaded procs
-proc_overload_pattern = re.compile(r'\b(\b[\w_]+[\w\d_]*\b)\s*::\s*proc\s*{(.*?)};')
-# captures: 1 -> name, 2 -> type/keyword
-type_pattern = re.compile(r'\b(\b[\w_]+[\w\d_]*\b)\s*[:]\s*[:]\s*(struct|union|enum|bit_field|bit_set|distinct)')
-# captures: 1 -> name
-const_pattern = re.compile(r'([A-Z0-9_]+)\s+::\s+(?!proc|distinct|enum|bit_set)\w+.*?;')
-# finds all the commas that are not surrounded by parens (used to filter out a proc with muliple params as a param to a proc)
-param_delim_pattern = re.compile(r',(?![^(]*\))')
-
-
-def reindex_all_package_names(view, current_folder):
-	package_to_path.clear()
-
-	# only include the active files folder if it isnt in the shared folder
-	if '/odin/shared' not in current_folder:
-		get_all_packages_in_folder(current_folder)
-	odin_path = os.path.expanduser(view.settings().get('odin_install_path', '~/odin'))
-	get_all_packages_in_folder(os.path.join(odin_path, 'core'), 'core')
-	get_all_packages_in_folder(os.path.join(odin_path, 'shared'), 'shared')
-
-
-# prefix should be 'core' or 'shared' to indicate special folders else None
-def get_all_packages_in_folder(path, prefix=None):
-	for root, dirs, files in os.walk(path):
-		dirs[:] = list(filter(lambda x: not x == '.git', dirs))
-		if len(fnmatch.filter(files, '*.odin')) > 0:
-			if prefix != None:
-				folder = root[root.index(prefix):]
-				package = os.path.basename(os.path.normpath(folder))
-				folder = folder.replace('/', ':', 1)
-				folder = folder.replace('\\', ':', 1)
-				package_to_path[package] = folder
+	# drops the removed Symbols and adds the added ones, the symbols of the files that were re-indexed
+	def update(self, removed, added):
+		with self.lock:
+			removed_by_id = dict()
+			for s in removed:
+				i = self.ids.get(s.name.lower())
+				if i != None:
+					removed_by_id.setdefault(i, set()).add(id(s))
+
+			# the packages of each changed name before the update
+			packages_by_id = dict()
+			for i, symbol_ids in removed_by_id.items():
+				packages_by_id[i] = set(s.package for s in self.symbols[i])
+				self.symbols[i] = [s for s in self.symbols[i] if id(s) not in symbol_ids]
+
+			for s in added:
+				name = sys.intern(s.name.lower())
+				i = self.ids.get(name)
+				if i == None:
+					i = self.ids[name] = len(self.names)
+					self.names.append(name)
+					self.symbols.append([])
+				if i not in packages_by_id:
+					packages_by_id[i] = set(s.package for s in self.symbols[i])
+				self.symbols[i].append(s)
+
+			for i, packages in packages_by_id.items():
+				new_packages = set(s.package for s in self.symbols[i])
+				for package in packages - new_packages:
+					self.ids_by_package[package].discard(i)
+				for package in new_packages - packages:
+					self.ids_by_package.setdefault(package, set()).add(i)
+			self.boosted = (None, None, 0)
+
+
+max_search_char_count = 3
+min_fuzzy_query_length = 3
+max_subsequence_candidates = 8000
+max_search_added_names = 1024
+
+
+# int with the bits of ids set
+def make_bitset(ids, count):
+	bits = bytearray((count + 7) // 8)
+	for i in ids:
+		bits[i >> 3] |= 1 << (i & 7)
+	return int.from_bytes(bits, 'little')
+
+
+# the set bits of bits, lowest first. They are read from the reversed binary string so that only the ids that are used
+# are ever turned into ints.
+def iterate_bits(bits):
+	binary = bin(bits)[:1:-1]
+	i = binary.find('1')
+	while i != -1:
+		yield i
+		i = binary.find('1', i + 1)
+
+
+# the workspace search index and the FileSymbols by path it was last given by get_symbol_search_index
+symbol_search_memo = [dict(), None]
+
+
+# SymbolSearchIndex over the declarations of files (FileSymbols by path). The symbols of the files that changed since the
+# last call are swapped in place and the index is only built again once more than max_search_added_names new names
+# were added that way.
+def get_symbol_search_index(files):
+	memo_files, index = symbol_search_memo
+	if index != None:
+		removed = [s for path, symbols in memo_files.items() if files.get(path) is not symbols for s in symbols.declarations]
+		added = [s for path, symbols in files.items() if memo_files.get(path) is not symbols for s in symbols.declarations]
+		# a different workspace is built right away
+		if len(added) <= max_search_added_names:
+			index.update(removed, added)
+			if index.added_count() <= max_search_added_names:
+				symbol_search_memo[0] = dict(files)
+				return index
+
+	index = SymbolSearchIndex(s for symbols in files.values() for s in symbols.declarations)
+	symbol_search_memo[:] = [dict(files), index]
+	return index
+
+
+# bump whenever the format of the saved symbols changes so stale on-disk indexes are ignored
+symbol_index_version = 3
+
+
+# a declaration found by the scanner. kind/signature is one of:
+#	- 'proc': (params, return type or None)
+#	- 'overload': variant names
+#	- 'type': type keyword (struct, enum, ...)
+#	- 'const': None
+#	- 'var': type or None (only from odin query)
+# package is the name of the folder of file. offset, line and column (0 based) are the position of the name in the file.
+# Names and packages are interned and the completion strings are only rendered for the symbols that are returned.
+class Symbol(object):
+	__slots__ = ['name', 'kind', 'package', 'signature', 'file', 'offset', 'line', 'column']
+
+	def __init__(self, name, kind, package, signature, file, offset, line=0, column=0):
+		self.name = name
+		self.kind = kind
+		self.package = package
+		self.signature = signature
+		self.file = file
+		self.offset = offset
+		self.line = line
+		self.column = column
+
+	# [trigger, result] completion with label shown next to it, the name of the file when label is None
+	def completion(self, label=None):
+		if label == None:
+			label = os.path.basename(self.file or '')
+
+		name = self.name
+		if self.kind == 'proc':
+			return make_completion_from_proc_components(name, self.signature[0], self.signature[1], label)
+		if self.kind == 'overload':
+			variants = '${0:overloads: ' + ', '.join(self.signature) + '}' if len(self.signature) > 0 else '${0}'
+			return [name + '     [proc overload, use a variant]\t' + label, name + '(' + variants + ')']
+		if self.kind == 'type':
+			return ['{}\t{} {}'.format(name, self.signature, label), name]
+		if self.kind == 'var':
+			return [name + '\t' + (self.signature or 'var'), name]
+		return [name + '\tconst', name]
+
+
+# fills in the file and package of freshly scanned symbols
+def set_symbols_source(symbols, path):
+	path = sys.intern(path)
+	package = sys.intern(os.path.basename(os.path.dirname(path)))
+	for symbol in symbols:
+		symbol.file = path
+		symbol.package = package
+
+
+# the declarations of a single file along with the completion index last built from them
+class FileSymbols(object):
+	__slots__ = ['key', 'declarations', 'index', 'unresolved_overloads', 'by_name']
+
+	def __init__(self, key, declarations):
+		self.key = key
+		self.declarations = declarations
+		self.index = None
+		self.unresolved_overloads = None
+		self.by_name = None
+
+	# the first declaration named name or None
+	def get_symbol(self, name):
+		if self.by_name == None:
+			by_name = dict()
+			for s in self.declarations:
+				by_name.setdefault(s.name, s)
+			self.by_name = by_name
+		return self.by_name.get(name)
+
+	def get_completion_index(self):
+		if self.index == None:
+			self.index = CompletionIndex(make_completion_symbols(self.declarations))
+		return self.index
+
+	# (overload name, variant) for the variants of the overload groups in this file that are not declared in it
+	def get_unresolved_overloads(self):
+		if self.unresolved_overloads == None:
+			procs = set(s.name for s in self.declarations if s.kind == 'proc')
+			self.unresolved_overloads = [(s.name, variant) for s in self.declarations if s.kind == 'overload'
+				for variant in s.signature if variant not in procs]
+		return self.unresolved_overloads
+
+
+# stores the declarations of a single file keyed by its path. Each entry is validated by a key that is (mtime, size) for
+# files on disk or the view change_count for open buffers so that an unchanged file is never re-read or re-scanned.
+# Entries of files on disk can be saved to and loaded from a versioned index file to warm start the next session.
+class FileSymbolCache(object):
+	def __init__(self):
+		self.entries = dict()
+		self.lock = threading.Lock()
+		self.dirty = False
+
+	def get_symbols(self, path, key):
+		entry = self.entries.get(path)
+		if entry == None or entry.key != key:
+			return None
+		return entry
+
+	# the last indexed symbols of the file at path, which may be stale, or None if it was never indexed
+	def get_latest_symbols(self, path):
+		return self.entries.get(path)
+
+	# the completion index of the entry is built before it is stored, on the indexer or the index helper threads, so that
+	# the completion queries only ever look it up
+	def set_symbols(self, path, key, declarations):
+		entry = FileSymbols(key, declarations)
+		entry.get_completion_index()
+		with self.lock:
+			self.entries[path] = entry
+			self.dirty = self.dirty or is_file_key(key)
+		return entry
+
+	def invalidate(self, path):
+		with self.lock:
+			self.entries.pop(path, None)
+
+	# the symbols of each file are saved as columns (names, kinds, signatures, offsets, lines, columns), the file and
+	# package follow from the path
+	def save(self, index_path):
+		with self.lock:
+			entries = [(path, entry) for path, entry in self.entries.items() if is_file_key(entry.key)]
+			self.dirty = False
+
+		files = dict((path, (entry.key,) + symbols_to_columns(entry.declarations)) for path, entry in entries)
+		save_pickle(index_path, {'version': symbol_index_version, 'files': files})
+
+	# loads a saved index, keeping any entry that is already cached. Returns the paths that were loaded.
+	def load(self, index_path):
+		index = load_pickle(index_path, symbol_index_version)
+		if index == None:
+			return []
+
+		loaded = []
+		with self.lock:
+			for path, entry in index['files'].items():
+				if path not in self.entries:
+					self.entries[path] = FileSymbols(entry[0], symbols_from_columns(entry[1:], path))
+					loaded.append(path)
+		return loaded
+
+
+# the decoded text of the files read from disk, validated by the same (mtime, size) key as FileSymbolCache so that the
+# import headers, build tags and declarations of a file are read from disk once. Only files up to max_file_bytes are
+# kept, the least recently used ones are dropped once max_bytes is exceeded. Open buffers never go through here, they
+# are read from their BufferModel which is validated by the view change_count.
+class FileContentCache(object):
+	def __init__(self, max_bytes=8 * 1024 * 1024, max_file_bytes=256 * 1024):
+		self.texts_by_path = collections.OrderedDict()
+		self.max_bytes = max_bytes
+		self.max_file_bytes = max_file_bytes
+		self.total_bytes = 0
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def configure(self, max_bytes):
+		with self.lock:
+			self.max_bytes = max_bytes
+			self.evict()
+
+	# the text of the file at path. key is its get_file_key, which is looked up when not given.
+	def read(self, path, key=None):
+		if key == None:
+			key = get_file_key(path)
+		text = self.get_cached(path, key)
+		with self.lock:
+			if text != None:
+				self.hits += 1
 			else:
-				# TODO: handle local, non-core/shared imports
-				print('TODO: add support for local, non-core/shared imports')
+				self.misses += 1
+		if text != None:
+			return text
+
+		text = decode_file(path, key[1])
+		if key[1] <= self.max_file_bytes:
+			with self.lock:
+				self.pop(path)
+				self.texts_by_path[path] = (key, text)
+				self.total_bytes += len(text)
+				self.evict()
+		return text
+
+	# the cached text of the file at path if it is still valid for key, else None. Only read counts as a hit or miss so
+	# that peeking (ie at the build tags of a file) does not skew the hit rate.
+	def get_cached(self, path, key):
+		with self.lock:
+			entry = self.texts_by_path.get(path)
+			if entry == None or entry[0] != key:
+				return None
+			self.texts_by_path.move_to_end(path)
+			return entry[1]
+
+	def invalidate(self, path):
+		with self.lock:
+			self.pop(path)
+
+	def pop(self, path):
+		entry = self.texts_by_path.pop(path, None)
+		if entry != None:
+			self.total_bytes -= len(entry[1])
+
+	def evict(self):
+		while self.total_bytes > self.max_bytes and len(self.texts_by_path) > 0:
+			_, (_, text) = self.texts_by_path.popitem(last=False)
+			self.total_bytes -= len(text)
+
+	def stats(self):
+		return {
+			'files': len(self.texts_by_path),
+			'bytes': self.total_bytes,
+			'hits': self.hits,
+			'misses': self.misses
+		}
+
+
+# pickles data to path through a temporary file so that an interrupted save never leaves a broken file behind
+def save_pickle(path, data):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	temp_path = path + '.tmp'
+	with open(temp_path, 'wb') as f:
+		pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+	os.replace(temp_path, path)
+
+
+# the dictionary pickled at path by save_pickle if its 'version' is version, else None. A missing, corrupt or outdated
+# file is never an error, the caches it holds are just rebuilt.
+def load_pickle(path, version):
+	try:
+		with open(path, 'rb') as f:
+			data = pickle.load(f)
+	except Exception:
+		return None
+
+	if not isinstance(data, dict) or data.get('version') != version:
+		return None
+	return data
+
+
+# (name, path, mtime, size) of the .odin files in folder sorted by name, the stamps sources are hashed by to tell whether
+# a package changed without reading it
+def get_source_stamps(folder):
+	stamps = []
+	try:
+		with os.scandir(folder) as entries:
+			for entry in entries:
+				if entry.name.endswith('.odin') and entry.is_file():
+					stat = entry.stat()
+					stamps.append((entry.name, entry.path, stat.st_mtime, stat.st_size))
+	except OSError:
+		pass
+	stamps.sort()
+	return stamps
+
+
+# (names, kinds, signatures, offsets, lines, columns) of symbols, the compact form they are pickled in
+def symbols_to_columns(symbols):
+	return ([s.name for s in symbols], [s.kind for s in symbols], [s.signature for s in symbols], [s.offset for s in symbols],
+		[s.line for s in symbols], [s.column for s in symbols])
+
+
+def symbols_from_columns(columns, path):
+	symbols = [Symbol(sys.intern(name), kind, None, signature, None, offset, line, column)
+		for name, kind, signature, offset, line, column in zip(*columns)]
+	set_symbols_source(symbols, path)
+	return symbols
+
+
+# how far past a token the scanner may look when it is done with it ('where' plus a word boundary). A string that fails
+# to match looks further, up to the end of its line or for a raw string up to the end of the file.
+max_scanner_lookahead = 8
+
+
+# the text and declarations of an open buffer, kept up to date edit by edit. An edit only re-scans from the last top
+# level checkpoint before it up to the first checkpoint after it where the scan lines up with the previous one again, so
+# typing inside a proc re-scans that proc and not the whole file. change_count is the buffer version the text matches.
+class BufferModel(object):
+	def __init__(self, text, change_count, path):
+		self.text = text
+		self.change_count = change_count
+		self.path = path
+		self.declarations = []
+		self.checkpoints = []
+		scan_top_level(text, 0, self.declarations, self.checkpoints)
+		set_symbols_source(self.declarations, path)
+
+	# replaces text[begin:end] with replacement
+	def apply_edit(self, begin, end, replacement):
+		delta = len(replacement) - (end - begin)
+		line_delta = replacement.count('\n') - self.text.count('\n', begin, end)
+		self.text = self.text[:begin] + replacement + self.text[end:]
+
+		# the scan must restart from a checkpoint whose tokens never looked at the edited text
+		checkpoints = self.checkpoints
+		limit = -1 if '`' in replacement else min(self.text.rfind('\n', 0, begin), begin - max_scanner_lookahead)
+		first = bisect.bisect_right(checkpoints, limit)
+		start = checkpoints[first - 1] if first > 0 else 0
+
+		# the old checkpoints past the edit, the first one the new scan lands on (shifted by delta) resumes the old results
+		resume = [bisect.bisect_right(checkpoints, end)]
+		def stop(pos):
+			i = resume[0]
+			while i < len(checkpoints) and checkpoints[i] + delta < pos:
+				i += 1
+			resume[0] = i
+			return i < len(checkpoints) and checkpoints[i] + delta == pos
+
+		declarations = []
+		new_checkpoints = []
+		offsets = [s.offset for s in self.declarations]
+		kept = bisect.bisect_left(offsets, start)
+		resumed = scan_top_level(self.text, start, declarations, new_checkpoints, stop)
+		set_symbols_source(declarations, self.path)
+		if resumed:
+			tail = self.declarations[bisect.bisect_left(offsets, checkpoints[resume[0]], kept):]
+			self.shift_symbols(tail, delta, line_delta, begin + len(replacement))
+			declarations.extend(tail)
+			new_checkpoints.extend(c + delta for c in checkpoints[resume[0]:])
+		self.declarations = self.declarations[:kept] + declarations
+		self.checkpoints = checkpoints[:first] + new_checkpoints
+
+	# moves the symbols past an edit that ended at edit_end (in the new text). Only the columns of the symbols on the
+	# same line as the end of the edit change.
+	def shift_symbols(self, symbols, delta, line_delta, edit_end):
+		same_line = True
+		for symbol in symbols:
+			symbol.offset += delta
+			symbol.line += line_delta
+			if same_line:
+				line_start = self.text.rfind('\n', 0, symbol.offset) + 1
+				if line_start <= edit_end:
+					symbol.column = symbol.offset - line_start
+				else:
+					same_line = False
+
+
+completions_cache = CompletionCache()
+file_symbols_cache = FileSymbolCache()
+file_contents_cache = FileContentCache()
+
+
+# a regex that is only compiled the first time it is used, so loading the plugin does not pay for the patterns of code
+# that may never run. The methods of the compiled pattern are then stored on the instance and cost the same to call.
+class LazyPattern(object):
+	def __init__(self, pattern, flags=0):
+		self.pattern = pattern
+		self.flags = flags
+
+	def __getattr__(self, name):
+		value = getattr(re.compile(self.pattern, self.flags), name)
+		setattr(self, name, value)
+		return value
+
+
+# the declaration scanner walks a file once, jumping between the tokens below. Strings and comments are matched as whole
+# tokens so that brackets and '::' inside of them are never seen.
+string_or_comment = r'//[^\n]*|/\*|"(?:\\.|[^"\\\n])*"|`[^`]*`|\'(?:\\.|[^\'\\\n])*\''
+# captures: 1 -> name of a 'name ::' declaration
+scanner_token_pattern = LazyPattern(string_or_comment + r'|[(\[]|\b([A-Za-z_]\w*)\s*::')
+balance_token_pattern = LazyPattern(string_or_comment + r'|[(){}\[\]]')
+param_token_pattern = LazyPattern(string_or_comment + r'|[(){}\[\],]')
+statement_token_pattern = LazyPattern(string_or_comment + r'|[(\[{;\n]')
+return_type_token_pattern = LazyPattern(r'//|/\*|[(\[{;\n]|---|\bwhere\b')
+block_comment_token_pattern = LazyPattern(r'/\*|\*/')
+# directives that may precede the declaration keyword: #force_inline, #type, inline, no_inline
+directive_pattern = LazyPattern(r'(?:(?:#\w+|inline\b|no_inline\b)\s*)*')
+# captures: 1 -> type/keyword
+keyword_pattern = LazyPattern(r'(proc|struct|union|enum|bit_field|bit_set|distinct)\b')
+calling_convention_pattern = LazyPattern(r'\s*(?:"[^"\n]*"\s*)?')
+whitespace_pattern = LazyPattern(r'\s*')
+const_name_pattern = LazyPattern(r'[A-Z0-9_]+$')
+completion_name_pattern = LazyPattern(r'\w+')
 
 
 def invalidate_completions(package):
 	completions_cache.invalidate_completions(package)
 
 
+def is_file_key(key):
+	return key[0] != 'view'
+
+
+def get_file_key(path):
+	stat = os.stat(path)
+	return (stat.st_mtime, stat.st_size)
+
+
+# the text of the file at path, key is its get_file_key if already known
+def read_file_text(path, key=None):
+	return file_contents_cache.read(path, key)
+
+
+# decodes the file at path like a text mode read. Files of mmap_min_bytes or more are decoded straight from a memory map
+# so the bytes are never copied into a read buffer first.
+def decode_file(path, size=None):
+	with open(path, 'rb') as f:
+		if size == None:
+			size = os.fstat(f.fileno()).st_size
+		if size >= mmap_min_bytes:
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+				text = str(m, 'utf-8')
+		else:
+			text = f.read().decode('utf-8')
+	if '\r' in text:
+		text = text.replace('\r\n', '\n').replace('\r', '\n')
+	return text
+
+
+mmap_min_bytes = 64 * 1024
+
+
+# parses the file at path unless the cached entry is still valid for get_key(path). Runs on the background indexer.
+def index_file(path, get_key, read_file):
+	try:
+		key = get_key(path)
+		if file_symbols_cache.get_symbols(path, key) == None:
+			file_symbols_cache.set_symbols(path, key, scan_declarations(read_file(path, key), path))
+	except (OSError, ValueError):
+		file_symbols_cache.invalidate(path)
+		file_contents_cache.invalidate(path)
+
+
+# re-validates every cached file on disk (ie after loading a saved index) by its mtime and size, re-parsing the files
+# that changed and dropping the ones that no longer exist. The completion indexes of the unchanged ones are built too.
+def revalidate_file_symbols():
+	for path, entry in list(file_symbols_cache.entries.items()):
+		if is_file_key(entry.key):
+			index_file(path, get_file_key, read_file_text)
+			entry = file_symbols_cache.get_latest_symbols(path)
+			if entry != None:
+				entry.get_completion_index()
+
+
 def get_completions_from_file(package_or_filename, text):
-	completions = get_type_and_const_completions(package_or_filename, text)
-	matches = proc_return_pattern.findall(text)
-	for m in matches:
-		name = m[0]
-		param_str = m[1].strip()
-		retval = None if len(m[2].strip()) == 0 else m[2].strip()
-
-		params = []
-
-		# find all the relevant commas that we need to split on. This filter our commans inside a param with a type that is
-		# a proc with multiple params itself.
-		commas = []
-		for pm in param_delim_pattern.finditer(param_str):
-			commas.append(pm.start(0))
-
-		if len(commas) > 0:
-			commas.append(len(param_str))
-			for i in range(len(commas)):
-				start = commas[i - 1] + 1 if i > 0 else 0
-				end = commas[i]
-				params.append(param_str[start:end].strip())
-		elif len(param_str):
-			params.append(param_str)
-
-		completions.append(make_completion_from_proc_components(name, params, retval, package_or_filename))
-
-	matches = proc_overload_pattern.findall(text)
-	for m in matches:
-		name = m[0]
-		overloads = m[1]
+	return [s.completion(package_or_filename) for s in make_completion_symbols(scan_declarations(text))]
+
+
+# the symbols to complete from the declarations of a file: types and consts, procs and then every overload group preceded
+# by its variants renamed to the group. Variants are resolved through a name -> proc map built during the proc pass, the
+# ones that are not declared in this file are left to make_package_overload_symbols.
+def make_completion_symbols(declarations):
+	symbols = [s for s in declarations if s.kind == 'type']
+	symbols.extend(s for s in declarations if s.kind == 'const')
+	procs = dict()
+	for s in declarations:
+		if s.kind == 'proc':
+			symbols.append(s)
+			procs.setdefault(s.name, s)
+
+	for s in declarations:
+		if s.kind != 'overload':
+			continue
 
 		# for overloads, we need to add completions for all the variants
-		for proc in [x.strip() + '(' for x in overloads.split(',')]:
-			for c in completions:
-				if c[0].startswith(proc):
-					new_completion = c[0].replace(proc, name + '(')
-					new_insertion = c[1].replace(proc, name + '(')
-					completions.append([new_completion, new_insertion])
-					break
-		completions.append([name + '     [proc overload, use a variant]\t' + package_or_filename, name + '(${0:overloads: ' + overloads + '})'])
+		for variant in s.signature:
+			proc = procs.get(variant)
+			if proc != None:
+				symbols.append(Symbol(s.name, 'proc', proc.package, proc.signature, proc.file, proc.offset, proc.line, proc.column))
+		symbols.append(s)
+
+	return symbols
+
+
+# the last files and result of make_package_overload_symbols, so that querying the same package again is free
+package_overloads_memo = [(), []]
+
+
+# symbols for the overload variants that are declared in a different file of the package than their overload group, ie
+# 'dot :: proc{dot_f32, dot_f64}' in linalg.odin with the variants in f32.odin and f64.odin. files is a list of the
+# FileSymbols of every file of the package.
+def make_package_overload_symbols(files):
+	memo_files, memo_symbols = package_overloads_memo
+	if len(memo_files) == len(files) and all(a is b for a, b in zip(memo_files, files)):
+		return memo_symbols
+
+	unresolved = [overload for symbols in files for overload in symbols.get_unresolved_overloads()]
+	overload_symbols = []
+	if len(unresolved) > 0:
+		procs = dict()
+		for symbols in files:
+			for s in symbols.declarations:
+				if s.kind == 'proc' and s.name not in procs:
+					procs[s.name] = s
+
+		for name, variant in unresolved:
+			proc = procs.get(variant)
+			if proc != None:
+				overload_symbols.append(Symbol(name, 'proc', proc.package, proc.signature, proc.file, proc.offset, proc.line, proc.column))
 
-	return completions
+	package_overloads_memo[:] = [list(files), overload_symbols]
+	return overload_symbols
 
 
 def get_type_and_const_completions(package_or_filename, text):
-	completions = []
-	matches = type_pattern.findall(text)
-	for m in matches:
-		completions.append(['{}\t{} {}'.format(m[0], m[1], package_or_filename), m[0]])
+	declarations = scan_declarations(text)
+	return [s.completion(package_or_filename) for kind in ('type', 'const') for s in declarations if s.kind == kind]
 
-	matches = const_pattern.findall(text)
-	for m in matches:
-		completions.append([m + '\tconst', m])
 
-	return completions
+# single pass over the file that finds all the declarations at file scope (including those nested in 'foreign' and 'when'
+# blocks). Proc bodies are skipped as a whole so local declarations are ignored. Returns a list of Symbols in the order
+# they appear, with their file and package filled in when path is given.
+def scan_declarations(text, path=None):
+	declarations = []
+	scan_top_level(text, 0, declarations)
+	if path != None:
+		set_symbols_source(declarations, path)
+	return declarations
 
 
-def make_completion_from_proc_components(proc_name, params, return_type, file_name):
-	trigger = proc_name + '('
-	result = proc_name + '('
+# position of the first top level declaration in text, which is where the package and import header of a file ends. None
+# if there is no declaration in text.
+def find_header_end(text):
+	pos = 0
+	while True:
+		m = scanner_token_pattern.search(text, pos)
+		if m == None:
+			return None
+		if m.group(1) != None:
+			return m.start()
+		pos = skip_block_comment(text, m.end()) if m.group(0) == '/*' else m.end()
+
+
+# scans the top level of text from pos, appending the declarations found. When checkpoints is given the position after
+# every top level token is appended to it: the scanner carries no other state, so scanning again from a checkpoint gives
+# the same results. Returns True if it stopped early at a checkpoint for which stop(pos) is True.
+def scan_top_level(text, pos, declarations, checkpoints=None, stop=None):
+	# lines are counted incrementally from one declaration to the next
+	line = text.count('\n', 0, pos)
+	counted = pos
+	while True:
+		m = scanner_token_pattern.search(text, pos)
+		if m == None:
+			return False
+
+		pos = m.end()
+		if m.group(1) != None:
+			count = len(declarations)
+			start = m.start()
+			pos = scan_declaration(text, m.group(1), start, pos, declarations)
+			if len(declarations) > count:
+				line += text.count('\n', counted, start)
+				counted = start
+				symbol = declarations[-1]
+				symbol.line = line
+				symbol.column = start - text.rfind('\n', 0, start) - 1
+		elif m.group(0) == '/*':
+			pos = skip_block_comment(text, pos)
+		elif m.group(0) in ('(', '['):
+			# attributes and 'when' conditions
+			pos = skip_balanced(text, m.start())
+
+		if checkpoints != None:
+			if stop != None and stop(pos):
+				return True
+			checkpoints.append(pos)
+
+
+# scans the right hand side of 'name ::' starting at pos, appends any declaration found and returns the end of it
+def scan_declaration(text, name, start, pos, declarations):
+	pos = whitespace_pattern.match(text, pos).end()
+	rhs = pos
+	pos = directive_pattern.match(text, pos).end()
+	m = keyword_pattern.match(text, pos)
+	keyword = m.group(1) if m != None else None
+
+	if keyword == 'proc':
+		pos = calling_convention_pattern.match(text, m.end()).end()
+		if text.startswith('{', pos):
+			end = skip_balanced(text, pos)
+			variants = [v.strip() for v in text[pos + 1:end - 1].split(',') if len(v.strip()) > 0]
+			declarations.append(Symbol(sys.intern(name), 'overload', None, tuple(variants), None, start))
+			return end
+
+		if not text.startswith('(', pos):
+			return pos
+		end = skip_balanced(text, pos)
+		params = split_params(text, pos + 1, end - 1)
+		return scan_proc_tail(text, name, start, params, end, declarations)
+
+	if keyword != None and keyword != 'proc':
+		declarations.append(Symbol(sys.intern(name), 'type', None, keyword, None, start))
+	elif const_name_pattern.match(name) and rhs == pos and (text[rhs:rhs + 1].isalnum() or text.startswith('_', rhs)):
+		declarations.append(Symbol(sys.intern(name), 'const', None, None, None, start))
+	return skip_statement(text, pos)
+
 
-	if len(params) > 0:
-		for p in range(len(params)):
-			if p > 0:
-				trigger += ', '
-				result += ', '
+# scans the return type and body of a proc whose params end at pos. Procs without a body or '---' are proc types.
+def scan_proc_tail(text, name, start, params, pos, declarations):
+	return_type = None
+	pos = whitespace_pattern.match(text, pos).end()
+	if text.startswith('->', pos):
+		pos += 2
+		return_start = pos
+		while True:
+			m = return_type_token_pattern.search(text, pos)
+			if m == None or m.group(0) not in ('(', '['):
+				pos = m.start() if m != None else len(text)
+				break
+			pos = skip_balanced(text, m.start())
+		return_type = text[return_start:pos].strip() or None
+		pos = whitespace_pattern.match(text, pos).end()
 
-			trigger += params[p]
-			result += '${' + str(p + 1) + ':' + params[p] + '}'
+	if text.startswith('where', pos):
+		m = statement_token_pattern.search(text, pos)
+		while m != None and m.group(0) != '{':
+			m = statement_token_pattern.search(text, skip_balanced(text, m.start()) if m.group(0) in ('(', '[') else m.end())
+		pos = m.start() if m != None else len(text)
 
-	trigger += ')'
-	result += ')'
+	if text.startswith('{', pos):
+		end = skip_balanced(text, pos)
+	elif text.startswith('---', pos) or text.startswith(';', pos):
+		end = pos + 1
+	else:
+		return pos
+
+	if len(name) > 1 and name[0] != '_':
+		# params and return types repeat a lot across a code base (ie 'allocator := context.allocator') so they are interned
+		signature = (tuple(sys.intern(p) for p in params), sys.intern(return_type) if return_type != None else None)
+		declarations.append(Symbol(sys.intern(name), 'proc', None, signature, None, start))
+	return end
+
+
+# returns the position just past the bracket that closes the one at pos
+def skip_balanced(text, pos):
+	depth = 0
+	while True:
+		m = balance_token_pattern.search(text, pos)
+		if m == None:
+			return len(text)
+
+		pos = m.end()
+		token = m.group(0)
+		if token == '/*':
+			pos = skip_block_comment(text, pos)
+		elif token in ('(', '{', '['):
+			depth += 1
+		elif token in (')', '}', ']'):
+			depth -= 1
+			if depth == 0:
+				return pos
+
+
+# returns the position just past the end of a (nested) block comment whose opening '/*' ends at pos
+def skip_block_comment(text, pos):
+	depth = 1
+	while depth > 0:
+		m = block_comment_token_pattern.search(text, pos)
+		if m == None:
+			return len(text)
+		pos = m.end()
+		depth += 1 if m.group(0) == '/*' else -1
+	return pos
+
+
+# returns the position of the end of the statement (newline or ';' outside of any brackets) starting at pos
+def skip_statement(text, pos):
+	while True:
+		m = statement_token_pattern.search(text, pos)
+		if m == None:
+			return len(text)
+
+		token = m.group(0)
+		if token in ('\n', ';'):
+			return m.start()
+		elif token == '/*':
+			pos = skip_block_comment(text, m.end())
+		elif token in ('(', '[', '{'):
+			pos = skip_balanced(text, m.start())
+		else:
+			pos = m.end()
+
+
+# splits the params between start and end on the commas that are not nested in brackets, dropping any comments
+def split_params(text, start, end):
+	params = []
+	param = ''
+	pos = start
+	while True:
+		m = param_token_pattern.search(text, pos, end)
+		if m == None:
+			param += text[pos:end]
+			break
+
+		token = m.group(0)
+		if token == ',':
+			params.append(param + text[pos:m.start()])
+			param = ''
+			pos = m.end()
+		elif token.startswith('//'):
+			param += text[pos:m.start()]
+			pos = m.end()
+		elif token == '/*':
+			param += text[pos:m.start()]
+			pos = min(skip_block_comment(text, m.end()), end)
+		elif token in ('(', '[', '{'):
+			close = min(skip_balanced(text, m.start()), end)
+			param += text[pos:close]
+			pos = close
+		else:
+			param += text[pos:m.end()]
+			pos = m.end()
+	params.append(param)
+
+	return [p.strip() for p in params if len(p.strip()) > 0]
+
+
+def make_completion_from_proc_components(proc_name, params, return_type, file_name):
+	trigger = proc_name + '(' + ', '.join(params) + ')'
+	result = proc_name + '(' + ', '.join('${' + str(p + 1) + ':' + param + '}' for p, param in enumerate(params)) + ')'
 
 	if return_type != None:
 		trigger += ' -> ' + return_type
@@ -143,6 +1127,32 @@ def make_completion_from_proc_components(proc_name, params, return_type, file_na
 	trigger += '\t ' + file_name
 
 	# proc completion
-	completion = [trigger, result]
+	return [trigger, result]
+
+
+# helper process of index_pool: reads pickled lists of paths (one package at a time) from stdin and writes back the
+# pickled [(path, key, columns)] of each list, with a None key for the files that could not be read
+def index_worker(stdin, stdout):
+	while True:
+		try:
+			paths = pickle.load(stdin)
+		except EOFError:
+			return
+
+		results = []
+		for path in paths:
+			try:
+				key = get_file_key(path)
+				results.append((path, key, symbols_to_columns(scan_declarations(decode_file(path, key[1])))))
+			except (OSError, ValueError):
+				results.append((path, None, None))
+		pickle.dump(results, stdout, index_worker_protocol)
+		stdout.flush()
+
+
+# the oldest protocol of every Python 3.4+ so the helper can be a different Python than the plugin host
+index_worker_protocol = 4
+
 
-	return completion
+if __name__ == '__main__':
+	index_worker(sys.stdin.buffer, sys.stdout.buffer)
@@ -0,0 +1,104 @@
+import time
+import threading
+import collections
+
+
+# latencies of the last max_samples measurements of one phase, in ms
+class LatencyHistogram(object):
+	def __init__(self, max_samples=1000):
+		self.samples = collections.deque(maxlen=max_samples)
+		self.count = 0
+
+	def add(self, ms):
+		self.samples.append(ms)
+		self.count += 1
+
+	# the value below which percent of the samples fall
+	def percentile(self, percent):
+		samples = sorted(self.samples)
+		if len(samples) == 0:
+			return 0.0
+		return samples[min(len(samples) - 1, int(len(samples) * percent / 100.0))]
+
+
+# times the phases of a single request. Every mark records the time since the previous one under the given phase.
+class RequestTimer(object):
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.last = self.start
+		self.phases = []
+
+	def mark(self, phase):
+		now = time.perf_counter()
+		self.phases.append((phase, (now - self.last) * 1000))
+		self.last = now
+
+	def total_ms(self):
+		return (self.last - self.start) * 1000
+
+
+# rolling latency histograms per phase of the completion path and of the background indexing, plus counters and the
+# last slow requests. Recorded from the main thread and the indexer so every update takes the lock.
+class CompletionStats(object):
+	def __init__(self, max_slow_requests=20):
+		self.lock = threading.Lock()
+		self.histograms = collections.OrderedDict()
+		self.counters = collections.Counter()
+		self.slow_requests = collections.deque(maxlen=max_slow_requests)
+
+	def add(self, phase, ms):
+		with self.lock:
+			histogram = self.histograms.get(phase)
+			if histogram == None:
+				histogram = self.histograms[phase] = LatencyHistogram()
+			histogram.add(ms)
+
+	def count(self, counter, n=1):
+		with self.lock:
+			self.counters[counter] += n
+
+	# records the phases of timer and its total. Requests slower than slow_ms (0 to never) are kept along with what
+	# get_details() returns and returned as a log line, else None is returned.
+	def add_request(self, timer, slow_ms=0, get_details=lambda: ''):
+		phases = timer.phases
+		for phase, ms in phases:
+			self.add(phase, ms)
+		total = timer.total_ms()
+		self.add('total', total)
+
+		if slow_ms <= 0 or total < slow_ms:
+			return None
+		line = '{:.1f}ms ({}) {}'.format(total, ', '.join('{} {:.1f}'.format(phase, ms) for phase, ms in phases), get_details())
+		with self.lock:
+			self.slow_requests.append('{} {}'.format(time.strftime('%H:%M:%S'), line))
+		return line
+
+	def reset(self):
+		with self.lock:
+			self.histograms.clear()
+			self.counters.clear()
+			self.slow_requests.clear()
+
+	# plain text table of every histogram, the counters and the slow requests
+	def report(self, extra_counters=()):
+		with self.lock:
+			histograms = list(self.histograms.items())
+			counters = sorted(list(self.counters.items()) + list(extra_counters))
+			slow_requests = list(self.slow_requests)
+
+		lines = ['{:<20} {:>8} {:>9} {:>9} {:>9} {:>9}'.format('phase', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms')]
+		for phase, histogram in histograms:
+			lines.append('{:<20} {:>8} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(phase, histogram.count, histogram.percentile(50),
+				histogram.percentile(95), histogram.percentile(99), histogram.percentile(100)))
+
+		lines.append('')
+		for name, value in counters:
+			lines.append('{:<32} {}'.format(name, value))
+
+		lines.append('')
+		lines.append('slow requests:' if len(slow_requests) > 0 else 'no slow requests (set odin_slow_completion_ms to log them)')
+		lines.extend(slow_requests)
+		return '\n'.join(lines) + '\n'
+
+
+completion_stats = CompletionStats()